@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: checkpoint.py
+  @Contact: 228077gy@gmail.com
+  @Description: checkpoint / restart of the per-rank scan for jobs that may be preempted or hit --time
+    1. the rank range is scanned in CHECKPOINT_STEP byte steps, after a step the processed offset and the
+       partial hour / user sums are written to <dir>/rank-00003.ckpt once every interval seconds
+    2. the file is pickled to a temp file and renamed -> a kill during the write keeps the old checkpoint
+    3. a checkpoint is only resumed when input fingerprint, number of ranks, byte range and scan options
+       all match, otherwise the rank starts from the beginning of its range
+    4. a step boundary needs no line alignment: a line belongs to the step holding its first byte
+  @Date: File created in 14:00-2026/10/20
+  @Modified by:
+  @Version: V1.0
+"""
+import os
+import pickle
+import time
+
+from column_cache import fingerprint
+
+CHECKPOINT_STEP = 1024 * 1024 * 1024  # 1GB between two chances to save
+CHECKPOINT_INTERVAL = 600  # seconds between two saves
+
+
+def checkpoint_path(directory, rank):
+    return os.path.join(directory, f'rank-{rank:05d}.ckpt')
+
+
+def checkpoint_key(filename, ranks, start, end, options):
+    """ what a checkpoint must have been written for to be resumed """
+    return {'fingerprint': fingerprint(filename), 'ranks': ranks, 'range': (start, end), 'options': tuple(options)}
+
+
+def save_checkpoint(path, key, pos, sums):
+    """ atomically replace the checkpoint at path """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump({'key': key, 'pos': pos, 'sums': sums}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_checkpoint(path):
+    """ {'key', 'pos', 'sums'} stored at path, None if there is none """
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def load_checkpoint(path, key):
+    """ (pos, sums) of a matching checkpoint, None if there is none """
+    state = read_checkpoint(path)
+    if state is None or state.get('key') != key:
+        return None
+    return state['pos'], state['sums']
+
+
+def checkpointed_scan(path, key, start, end, sums, scan_piece, interval=CHECKPOINT_INTERVAL,
+                      step=CHECKPOINT_STEP):
+    """ scan_piece(a, b, sums) over [start, end) in steps, resumed from and saved to path, returns (sums, resumed_at) """
+    resumed_at = None
+    state = load_checkpoint(path, key)
+    pos = start
+    if state is not None:
+        pos, sums = state
+        resumed_at = pos
+
+    last_save = time.monotonic()
+    while pos < end:
+        stop = min(pos + step, end)
+        scan_piece(pos, stop, sums)
+        pos = stop
+        # the finished range is saved too, a job killed during the reduction restarts with no scan at all
+        if pos == end or time.monotonic() - last_save >= interval:
+            save_checkpoint(path, key, pos, sums)
+            last_save = time.monotonic()
+    return sums, resumed_at
+
+
+def remove_checkpoint(path):
+    """ drop the checkpoint of a finished job """
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: column_cache.py
+  @Contact: 228077gy@gmail.com
+  @Description: one-time columnar extract of an ndjson file, later analyses run off memory-mapped columns
+    1. extract: every rank parses its byte range once and writes one part of binary columns
+         hour.i4 (epoch hour) | user.i4 (part-local user index) | sentiment.f8 (or f4)
+       plus the part's user dictionary: user_id.i8 (account id) and user_name.bin / user_name_end.i8
+    2. only records that pass the analysis filter are kept (created_at, sentiment, id, username, valid hour)
+    3. the cache is keyed by size, mtime and a blake2b hash of sampled blocks of the input, a changed
+       input is never analysed from a stale cache
+    4. usage: mpiexec -n 8 python column_cache.py large-144G.ndjson [--cache-dir DIR] [--sentiment-dtype f4]
+       afterwards mastodon_analysis.py finds <input>.cols/ by itself
+  @Date: File created in 15:30-2026/10/19
+  @Modified by:
+  @Version: V1.0
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from hour_bucket import epoch_hour
+from hour_histogram import HourHistogram
+from mmap_reader import iter_lines, open_mmap, split_ranges
+from record_parser import get_parser
+from user_accumulator import to_int_ids
+
+CACHE_VERSION = 1
+META_FILE = 'meta.json'
+SAMPLE_BLOCKS = 16
+SAMPLE_SIZE = 64 * 1024
+
+
+def default_cache_dir(filename):
+    return filename + '.cols'
+
+
+def sampled_hash(filename, length):
+    """ hash of SAMPLE_BLOCKS evenly spaced blocks of the first length bytes (first and last block included) """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as f:
+        step = max(length - SAMPLE_SIZE, 0) / max(SAMPLE_BLOCKS - 1, 1)
+        for i in range(SAMPLE_BLOCKS):
+            f.seek(int(i * step))
+            digest.update(f.read(min(SAMPLE_SIZE, length)))
+    return digest.hexdigest()
+
+
+def fingerprint(filename):
+    """ size, mtime and the sampled hash of the whole file """
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sample_hash': sampled_hash(filename, stat.st_size)}
+
+
+def load_meta(filename, cache_dir=None):
+    """ meta of a valid cache of filename, None if there is none or it is stale """
+    cache_dir = cache_dir or default_cache_dir(filename)
+    try:
+        with open(os.path.join(cache_dir, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != CACHE_VERSION or meta.get('fingerprint') != fingerprint(filename):
+        return None
+    meta['dir'] = cache_dir
+    return meta
+
+
+def extract_range(filename, start, end, parser='json', decoder='json'):
+    """ columns and user dictionary of the [start, end) byte range """
+    parse_line = get_parser(parser, decoder)
+    hours, users, sentiments = [], [], []
+    user_index = {}  # (user_id, username) -> part-local index
+
+    with open_mmap(filename) as mm:
+        for line in iter_lines(mm, start, end):
+            created_at, sentiment, user_id, username = parse_line(line)
+            if created_at and sentiment is not None and user_id and username:
+                hour = epoch_hour(created_at)
+                if hour is None:
+                    continue
+                hours.append(hour)
+                sentiments.append(sentiment)
+                users.append(user_index.setdefault((user_id, username), len(user_index)))
+    return hours, users, sentiments, list(user_index)
+
+
+def write_part(cache_dir, name, hours, users, sentiments, user_keys, sentiment_dtype='f8'):
+    """ write the columns of one part, returns its meta entry """
+    prefix = os.path.join(cache_dir, name)
+    np.asarray(hours, dtype=np.int32).tofile(prefix + '.hour.i4')
+    np.asarray(users, dtype=np.int32).tofile(prefix + '.user.i4')
+    np.asarray(sentiments, dtype=np.float64).astype(sentiment_dtype).tofile(prefix + '.sentiment.' + sentiment_dtype)
+    to_int_ids([user_id for user_id, _ in user_keys]).tofile(prefix + '.user_id.i8')
+    encoded = [username.encode('utf-8') for _, username in user_keys]
+    with open(prefix + '.user_name.bin', 'wb') as f:
+        f.write(b''.join(encoded))
+    np.cumsum([len(n) for n in encoded], dtype=np.int64).tofile(prefix + '.user_name_end.i8')
+    return {'name': name, 'records': len(hours), 'users': len(user_keys)}
+
+
+def read_part(meta, part):
+    """ memory-mapped (hours, users, sentiments) columns of a part """
+    prefix = os.path.join(meta['dir'], part['name'])
+    dtype = meta['sentiment_dtype']
+
+    def column(suffix, column_dtype):
+        if part['records'] == 0:
+            return np.empty(0, column_dtype)
+        return np.memmap(prefix + suffix, dtype=column_dtype, mode='r')
+    return column('.hour.i4', np.int32), column('.user.i4', np.int32), column('.sentiment.' + dtype, dtype)
+
+
+def read_users(meta, part):
+    """ (account ids int64 array, usernames list) of a part's user dictionary """
+    prefix = os.path.join(meta['dir'], part['name'])
+    if part['users'] == 0:
+        return np.empty(0, np.int64), []
+    ids = np.fromfile(prefix + '.user_id.i8', dtype=np.int64)
+    ends = np.fromfile(prefix + '.user_name_end.i8', dtype=np.int64)
+    with open(prefix + '.user_name.bin', 'rb') as f:
+        blob = f.read()
+    starts = np.concatenate([[0], ends[:-1]])
+    return ids, [blob[s:e].decode('utf-8') for s, e in zip(starts.tolist(), ends.tolist())]
+
+
+def scan_cache(meta, rank, size, hour_sentiment, user_sentiment):
+    """ add the sums of the parts owned by rank (round robin) into the given accumulators """
+    for part in meta['parts'][rank::size]:
+        hours, users, sentiments = read_part(meta, part)
+        if part['records'] == 0:
+            continue
+        if isinstance(hour_sentiment, HourHistogram):
+            hour_sentiment.add_batch(hours.astype(np.int64), sentiments.astype(np.float64))
+        else:
+            # hour sums: one bincount over the part's hour range
+            first_hour = int(hours.min())
+            hour_sums = np.bincount(hours - first_hour, weights=sentiments)
+            for offset in np.flatnonzero(hour_sums).tolist():
+                hour_sentiment[first_hour + offset] += float(hour_sums[offset])
+
+        # user sums: one bincount over the part-local user index, then keyed like a scan would
+        user_sums = np.bincount(users, weights=sentiments, minlength=part['users'])
+        ids, names = read_users(meta, part)
+        if isinstance(user_sentiment, dict):
+            for name, value in zip(names, user_sums.tolist()):
+                user_sentiment[name] += value
+        else:
+            user_sentiment.add_batch(ids, user_sums, names.__getitem__)
+    return hour_sentiment, user_sentiment
+
+
+def extract(comm, filename, cache_dir=None, parser='json', decoder='json', sentiment_dtype='f8'):
+    """ collective: write the column cache of filename, returns its meta on every rank """
+    rank, size = comm.Get_rank(), comm.Get_size()
+    cache_dir = cache_dir or default_cache_dir(filename)
+    if rank == 0:
+        os.makedirs(cache_dir, exist_ok=True)
+        # an old meta must not validate half-written parts
+        if os.path.exists(os.path.join(cache_dir, META_FILE)):
+            os.remove(os.path.join(cache_dir, META_FILE))
+    comm.Barrier()
+
+    start, end = split_ranges(os.path.getsize(filename), size)[rank]
+    part = write_part(cache_dir, f'part-{rank:05d}', *extract_range(filename, start, end, parser, decoder),
+                      sentiment_dtype=sentiment_dtype)
+    parts = comm.gather(part, root=0)
+
+    meta = None
+    if rank == 0:
+        meta = {'version': CACHE_VERSION, 'source': os.path.abspath(filename),
+                'fingerprint': fingerprint(filename), 'sentiment_dtype': sentiment_dtype, 'parts': parts}
+        with open(os.path.join(cache_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        meta['dir'] = cache_dir
+    return comm.bcast(meta, root=0)
+
+
+def main():
+    from mpi4py import MPI
+    from decoders import DECODER_CHOICES
+    from record_parser import PARSERS
+
+    parser = argparse.ArgumentParser(description='one-time columnar extract of an ndjson file')
+    parser.add_argument('filename', help='ndjson input file')
+    parser.add_argument('--cache-dir', default=None, help='output directory (default: <filename>.cols)')
+    parser.add_argument('--parser', choices=sorted(PARSERS), default='json')
+    parser.add_argument('--decoder', choices=DECODER_CHOICES, default='json')
+    parser.add_argument('--sentiment-dtype', choices=('f8', 'f4'), default='f8',
+                        help='f8 keeps the sums identical to a text scan, f4 halves that column')
+    args = parser.parse_args()
+
+    comm = MPI.COMM_WORLD
+    start_time = MPI.Wtime()
+    meta = extract(comm, args.filename, args.cache_dir, args.parser, args.decoder, args.sentiment_dtype)
+    if comm.Get_rank() == 0:
+        records = sum(part['records'] for part in meta['parts'])
+        print(f"Extracted {records} records of {args.filename} into {meta['dir']} "
+              f"in {MPI.Wtime() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
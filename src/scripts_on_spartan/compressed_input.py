@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: compressed_input.py
+  @Contact: 228077gy@gmail.com
+  @Description: parallel reading of frame-seekable .ndjson.gz / .ndjson.zst inputs
+    1. seekable layout: the file is a sequence of independent frames (gzip members / zstd frames), every
+       frame holds whole lines (~FRAME_SIZE of text) -> any frame can be decompressed on its own, and
+       concatenated they are still a normal .gz / .zst for gunzip / zstd -d
+    2. frame index (<filename>.frames.npz): compressed start offset and text size of every frame plus
+       the input fingerprint, written by the converter or built once by one sequential pass
+    3. ranks keep the byte-range split of the plain text path, but in compressed bytes: a frame belongs
+       to the range holding its first compressed byte, so static / dynamic / pool pieces tile the frames
+    4. read_blocks() / read_lines() are the one reader of local_scan and the query engine: mmap blocks of
+       plain text, line-aligned blocks of decompressed frames of compressed input (decompression happens
+       inside the scanning rank / pool worker, in parallel, streamed in bounded pieces)
+    5. a plain single-member .gz is one frame: it is read by one rank with bounded memory but without any
+       parallelism, mastodon_analysis.py warns and points to convert
+    6. zstd needs the optional zstandard package, gzip only the standard library
+    7. usage: python compressed_input.py convert large-144G.ndjson large-144G.ndjson.zst [--workers 8]
+              python compressed_input.py index some-multi-member.ndjson.gz
+  @Date: File created in 10:10-2026/10/25
+  @Modified by:
+  @Version: V1.0
+"""
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import zlib
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from column_cache import fingerprint
+from mmap_reader import BLOCK_SIZE, iter_blocks, open_mmap
+from prefetch_reader import PREFETCH_MB, prefetch_blocks
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = {'.gz': 'gzip', '.zst': 'zstd'}
+READERS = ('mmap', 'prefetch')  # how plain text is read
+FRAME_SIZE = 16 * 1024 * 1024  # text per frame: small enough for fine-grained pieces, big enough to compress well
+COMPRESSED_PIECE = 1024 * 1024  # compressed bytes fed to a decompressor at a time
+TEXT_PIECE = 8 * 1024 * 1024  # most text one gzip decompress() call returns
+
+# offsets[i] = compressed start of frame i, offsets[-1] = file size; sizes[i] = text bytes of frame i
+FrameIndex = namedtuple('FrameIndex', ['codec', 'offsets', 'sizes'])
+
+
+def codec_of(filename):
+    """ 'gzip' / 'zstd' for a compressed input, None for plain text """
+    return CODECS.get(os.path.splitext(filename)[1])
+
+
+def frame_index_path(filename):
+    return filename + '.frames.npz'
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise ValueError("zstd input needs the zstandard package (pip install zstandard)")
+
+
+def compress_frame(codec, text, level):
+    if codec == 'gzip':
+        return gzip.compress(text, compresslevel=level, mtime=0)
+    _require_zstd()
+    return zstandard.ZstdCompressor(level=level, write_content_size=True).compress(text)
+
+
+def stream_frame(codec, mm, start, end, text_piece=TEXT_PIECE):
+    """ yield the text of the frame mm[start:end] in pieces of at most text_piece bytes for gzip (about
+        COMPRESSED_PIECE times the compression ratio for zstd), a single-member file is one huge frame """
+    pos = start
+    if codec == 'gzip':
+        decompressor = zlib.decompressobj(wbits=31)
+        while pos < end:
+            data = mm[pos:min(pos + COMPRESSED_PIECE, end)]
+            pos += len(data)
+            while data:
+                # max_length bounds the output, the rest of the input waits in unconsumed_tail
+                yield decompressor.decompress(data, text_piece)
+                data = decompressor.unconsumed_tail
+        yield decompressor.flush()
+        return
+    _require_zstd()
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    while pos < end:
+        data = mm[pos:min(pos + COMPRESSED_PIECE, end)]
+        pos += len(data)
+        yield decompressor.decompress(data)
+
+
+def line_blocks(texts, block_size):
+    """ regroup text pieces into blocks of whole lines of about block_size bytes """
+    parts, size = [], 0
+    for text in texts:
+        parts.append(text)
+        size += len(text)
+        if size < block_size:
+            continue
+        data = b''.join(parts)
+        cut = data.rfind(b'\n') + 1
+        if cut:
+            yield data[:cut]
+            data = data[cut:]
+        parts, size = [data], len(data)
+    data = b''.join(parts)
+    if data:
+        yield data
+
+
+def scan_frames(filename):
+    """ FrameIndex of an existing multi-member / multi-frame file, one sequential decompression pass """
+    codec = codec_of(filename)
+    if codec == 'zstd':
+        _require_zstd()
+    offsets, sizes = [0], []
+    with open_mmap(filename) as mm:
+        pos = 0
+        while pos < len(mm):
+            if codec == 'gzip':
+                decompressor = zlib.decompressobj(wbits=31)
+            else:
+                decompressor = zstandard.ZstdDecompressor().decompressobj()
+            # feed the frame piece by piece until the decompressor reports its end
+            text_size, cursor, last_byte = 0, pos, b'\n'
+            while cursor < len(mm):
+                piece = mm[cursor:cursor + BLOCK_SIZE]
+                text = decompressor.decompress(piece)
+                text_size += len(text)
+                last_byte = text[-1:] or last_byte
+                unused = len(decompressor.unused_data)
+                if decompressor.eof:
+                    cursor += len(piece) - unused
+                    break
+                cursor += len(piece)
+            else:
+                raise ValueError(f"{filename}: truncated frame at byte {pos}")
+            if last_byte != b'\n' and cursor < len(mm):
+                raise ValueError(f"{filename}: frame at byte {pos} ends inside a line, recompress it with "
+                                 f"'compressed_input.py convert'")
+            offsets.append(cursor)
+            sizes.append(text_size)
+            pos = cursor
+    return FrameIndex(codec, np.array(offsets, np.int64), np.array(sizes, np.int64))
+
+
+def save_frame_index(filename, index, path=None):
+    np.savez(path or frame_index_path(filename), codec=index.codec, offsets=index.offsets, sizes=index.sizes,
+             fingerprint=json.dumps(fingerprint(filename)))
+
+
+def load_frame_index(filename, path=None):
+    """ the frame index of filename, None if there is none or the file changed since it was built """
+    try:
+        with np.load(path or frame_index_path(filename)) as data:
+            if json.loads(str(data['fingerprint'])) != fingerprint(filename):
+                return None
+            return FrameIndex(str(data['codec']), data['offsets'], data['sizes'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def ensure_frame_index(filename):
+    """ load the frame index, build and save it first if it is missing or stale (one process) """
+    index = load_frame_index(filename)
+    if index is None:
+        index = scan_frames(filename)
+        save_frame_index(filename, index)
+    return index
+
+
+@lru_cache(maxsize=4)
+def _cached_index(filename, size, mtime_ns):
+    index = load_frame_index(filename)
+    if index is None:
+        raise ValueError(f"no valid frame index for {filename}, run 'compressed_input.py index {filename}'")
+    return index
+
+
+def frame_index(filename):
+    """ load_frame_index() once per process and file version """
+    stat = os.stat(filename)
+    return _cached_index(filename, stat.st_size, stat.st_mtime_ns)
+
+
+def read_blocks(filename, start, end, block_size=BLOCK_SIZE, reader='mmap', prefetch_mb=PREFETCH_MB):
+    """ yield text blocks of whole lines: the lines whose first byte lies in [start, end) of plain text
+        (mmap slices, or read ahead by a thread with reader='prefetch'), the text of the frames whose
+        first compressed byte lies in [start, end) of compressed input, decompressed as a stream and
+        regrouped into blocks of about block_size """
+    codec = codec_of(filename)
+    if codec is None and reader == 'prefetch':
+        yield from prefetch_blocks(filename, start, end, budget_mb=prefetch_mb)
+        return
+    with open_mmap(filename) as mm:
+        if codec is None:
+            for block_start, block_end in iter_blocks(mm, start, end, block_size):
+                yield mm[block_start:block_end]
+            return
+        index = frame_index(filename)
+        first, last = np.searchsorted(index.offsets[:-1], [start, end])
+        for i in range(first, last):
+            texts = stream_frame(codec, mm, index.offsets[i], index.offsets[i + 1], min(block_size, TEXT_PIECE))
+            yield from line_blocks(texts, block_size)
+
+
+def block_lines(blocks):
+    """ yield raw lines (bytes, newline stripped, empty lines skipped) of text blocks of whole lines """
+    for block in blocks:
+        for line in block.split(b'\n'):
+            if line:
+                yield line
+
+
+def read_lines(filename, start, end, block_size=BLOCK_SIZE, reader='mmap', prefetch_mb=PREFETCH_MB):
+    """ yield the lines of read_blocks() """
+    return block_lines(read_blocks(filename, start, end, block_size, reader, prefetch_mb))
+
+
+def iter_frame_texts(source, frame_size):
+    """ yield ~frame_size chunks of whole lines of a plain or .gz text file """
+    opener = gzip.open if codec_of(source) == 'gzip' else open
+    with opener(source, 'rb') as f:
+        while True:
+            text = f.read(frame_size)
+            if not text:
+                return
+            if not text.endswith(b'\n'):
+                text += f.readline()
+            yield text
+
+
+def _compress_task(task):
+    codec, text, level = task
+    return compress_frame(codec, text, level), len(text)
+
+
+def convert(source, target, frame_size=FRAME_SIZE, level=None, workers=1):
+    """ recompress source (plain or .gz ndjson) into the seekable layout of target, writes its frame index """
+    codec = codec_of(target)
+    if codec is None:
+        raise ValueError(f"target {target!r} must end with {' or '.join(CODECS)}")
+    if codec == 'zstd':
+        _require_zstd()
+    level = level if level is not None else (6 if codec == 'gzip' else 3)
+    offsets, sizes = [0], []
+    tasks = ((codec, text, level) for text in iter_frame_texts(source, frame_size))
+    # frames are compressed in parallel but written in order
+    with multiprocessing.get_context('fork').Pool(workers) as pool, open(target, 'wb') as out:
+        for frame, text_size in pool.imap(_compress_task, tasks):
+            out.write(frame)
+            offsets.append(offsets[-1] + len(frame))
+            sizes.append(text_size)
+    index = FrameIndex(codec, np.array(offsets, np.int64), np.array(sizes, np.int64))
+    save_frame_index(target, index)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='seekable compressed ndjson: converter and frame index')
+    commands = parser.add_subparsers(dest='command', required=True)
+    conv = commands.add_parser('convert', help='recompress a plain / .gz ndjson into independent frames')
+    conv.add_argument('source')
+    conv.add_argument('target', help='output .ndjson.gz or .ndjson.zst')
+    conv.add_argument('--frame-size', type=int, default=FRAME_SIZE, help='text bytes per frame')
+    conv.add_argument('--level', type=int, default=None, help='compression level (gzip 6, zstd 3)')
+    conv.add_argument('--workers', type=int, default=os.cpu_count(), help='compression processes')
+    build = commands.add_parser('index', help='build the frame index of an existing multi-frame file')
+    build.add_argument('filename')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'convert':
+            index = convert(args.source, args.target, args.frame_size, args.level, args.workers)
+            target = args.target
+        else:
+            index = scan_frames(args.filename)
+            save_frame_index(args.filename, index)
+            target = args.filename
+    except ValueError as e:
+        parser.error(str(e))
+    text, compressed = int(index.sizes.sum()), int(index.offsets[-1])
+    print(f"{target}: {len(index.sizes)} {index.codec} frames, {text / 2 ** 20:.1f} MB text in "
+          f"{compressed / 2 ** 20:.1f} MB ({text / max(compressed, 1):.1f}x), index {frame_index_path(target)}")
+    if len(index.sizes) == 1:
+        print(f"warning: one frame can only be read by one rank, recompress it with "
+              f"'compressed_input.py convert {target} <new file>' to read it in parallel")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: decoders.py
+  @Contact: 228077gy@gmail.com
+  @Description: pluggable full-line json decoders, each returns (created_at, sentiment, user_id, username)
+    1. json    -- stdlib json.loads, always available
+    2. orjson  -- orjson.loads into dicts (pip install orjson)
+    3. msgspec -- msgspec typed schema Post{createdAt, sentiment, account{id, username}}, unknown
+                  fields (content, note, emojis ...) are skipped without building python objects
+    4. "auto" picks the fastest installed one, a missing backend falls back to stdlib json
+    5. get_loader() gives the plain loads of a backend (whole line as dicts), for the query engine
+  @Date: File created in 16:30-2026/10/17
+  @Modified by:
+  @Version: V1.0
+"""
+import json
+import sys
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# every backend raises one of these for a line it can not decode
+DECODE_ERRORS = (ValueError,) if msgspec is None else (ValueError, msgspec.DecodeError)
+
+
+def _record(data):
+    """ (created_at, sentiment, user_id, username) from a decoded dict """
+    doc = data.get('doc', {})
+    account = doc.get('account', {})
+    return doc.get('createdAt', None), doc.get('sentiment', None), account.get('id', None), \
+        account.get('username', None)
+
+
+def decode_json(line):
+    return _record(json.loads(line))
+
+
+def decode_orjson(line):
+    return _record(orjson.loads(line))
+
+
+if msgspec is not None:
+    class Account(msgspec.Struct):
+        id: Optional[str] = None
+        username: Optional[str] = None
+
+    class Post(msgspec.Struct):
+        createdAt: Optional[str] = None
+        sentiment: Optional[float] = None
+        account: Account = msgspec.field(default_factory=Account)
+
+    class Line(msgspec.Struct):
+        doc: Post = msgspec.field(default_factory=Post)
+
+    _line_decoder = msgspec.json.Decoder(Line)
+
+    def decode_msgspec(line):
+        doc = _line_decoder.decode(line).doc
+        return doc.createdAt, doc.sentiment, doc.account.id, doc.account.username
+
+DECODERS = {'json': decode_json}
+if orjson is not None:
+    DECODERS['orjson'] = decode_orjson
+if msgspec is not None:
+    DECODERS['msgspec'] = decode_msgspec
+
+# whole-line loads per backend, msgspec without a schema builds plain dicts too
+LOADERS = {'json': json.loads}
+if orjson is not None:
+    LOADERS['orjson'] = orjson.loads
+if msgspec is not None:
+    LOADERS['msgspec'] = msgspec.json.decode
+
+# --decoder choices, "auto" = first installed of msgspec > orjson > json
+DECODER_CHOICES = ('auto', 'json', 'orjson', 'msgspec')
+
+
+def resolve_decoder(name):
+    """ name of the backend actually used for --decoder name """
+    if name == 'auto':
+        return next(n for n in ('msgspec', 'orjson', 'json') if n in DECODERS)
+    if name not in DECODER_CHOICES:
+        raise ValueError(f"unknown decoder {name!r}, choose from {DECODER_CHOICES}")
+    if name not in DECODERS:
+        print(f"decoder {name} is not installed, falling back to json", file=sys.stderr)
+        return 'json'
+    return name
+
+
+def get_decoder(name='json'):
+    """ record decoder function for --decoder name """
+    return DECODERS[resolve_decoder(name)]
+
+
+def get_loader(name='json'):
+    """ whole-line loads function for --decoder name """
+    return LOADERS[resolve_decoder(name)]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: incremental.py
+  @Contact: 228077gy@gmail.com
+  @Description: incremental processing of an append-only ndjson harvest (--incremental)
+    1. the state file keeps the last processed byte offset and the merged hour / user sums of [0, offset)
+    2. a new run hashes sampled blocks of [0, offset) and compares them with the stored prefix hash, only an
+       unchanged prefix is trusted -> the ranks scan just the appended tail [offset, end)
+    3. end is the byte after the last newline: a line the harvester is still writing waits for the next run
+    4. the tail sums are gathered to root and merged into the stored sums, root saves the new state
+       (written like a checkpoint: temp file + rename)
+  @Date: File created in 16:30-2026/10/20
+  @Modified by:
+  @Version: V1.0
+"""
+from checkpoint import read_checkpoint, save_checkpoint
+from column_cache import sampled_hash
+from local_scan import merge_sums, new_sums
+from mmap_reader import open_mmap, split_span
+from reduction import top_bottom
+from user_accumulator import UserAccumulator, top_bottom_arrays
+from user_sketch import UserSketch
+
+
+def state_path(filename):
+    return filename + '.state'
+
+
+def complete_end(filename):
+    """ offset just after the last newline of the file (0 if it has none) """
+    with open_mmap(filename) as mm:
+        return mm.rfind(b'\n') + 1
+
+
+def sums_key(options):
+    """ the options that decide the type / shape of the stored sums """
+    return {'users': options.users, 'hours': options.hours, 'sketch_mb': options.sketch_mb}
+
+
+def load_state(filename, path, options):
+    """ (offset, (hour, users)) of a state whose prefix is unchanged, (0, empty sums) otherwise """
+    state = read_checkpoint(path)
+    if state is not None:
+        key, offset = state['key'], state['pos']
+        same_sums = all(key.get(name) == value for name, value in sums_key(options).items())
+        if same_sums and offset <= complete_end(filename) and key.get('prefix_hash') == sampled_hash(filename, offset):
+            return offset, state['sums']
+    return 0, new_sums(options)
+
+
+def incremental_scan(comm, filename, options, scan_piece, path=None, root=0):
+    """ collective: scan the tail appended since the last run with scan_piece(a, b, sums),
+        returns (offset scanned from, end, merged (hour, users)) on root and (offset, end, None) elsewhere """
+    rank, size = comm.Get_rank(), comm.Get_size()
+    path = path or state_path(filename)
+
+    stored = None
+    if rank == root:
+        offset, stored = load_state(filename, path, options)
+        end = complete_end(filename)
+    else:
+        offset = end = None
+    offset, end = comm.bcast((offset, end), root=root)
+
+    # the tail is small compared with the prefix, a plain static split is enough
+    sums = new_sums(options)
+    start, stop = split_span(offset, end, size)[rank]
+    if start < stop:
+        scan_piece(start, stop, sums)
+    parts = comm.gather(sums, root=root)
+    if rank != root:
+        return offset, end, None
+
+    # rank order merge onto the stored sums
+    hour_total, user_total = stored
+    for hours, users in parts:
+        merge_sums(hour_total, hours)
+        merge_sums(user_total, users)
+    save_checkpoint(path, {**sums_key(options), 'prefix_hash': sampled_hash(filename, end)}, end,
+                    (hour_total, user_total))
+    return offset, end, (hour_total, user_total)
+
+
+def local_top_users(user_sentiment, k=5):
+    """ (happiest, saddest) [(username, score)] of a merged user dict, UserAccumulator or UserSketch """
+    if isinstance(user_sentiment, UserSketch):
+        return user_sentiment.top_bottom(k)
+    if not isinstance(user_sentiment, UserAccumulator):
+        return top_bottom(user_sentiment.items(), k)
+    ids, sums = user_sentiment.arrays()
+    top, bottom = top_bottom_arrays(sums, k)
+    names = user_sentiment.names_of(ids[list(top) + list(bottom)])
+    return tuple([(names[int(ids[i])], float(sums[i])) for i in part] for part in (top, bottom))
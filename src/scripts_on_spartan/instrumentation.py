@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: instrumentation.py
+  @Contact: 228077gy@gmail.com
+  @Description: per-rank, per-stage counters and the report gathered on rank 0 (--report)
+    1. stages: read | parse | bucket | aggregate | communicate | merge | output
+       every stage keeps seconds, bytes, lines and failures (unparsable lines, invalid createdAt)
+    2. the scan loop is timed once per batch of lines and per stage, not per line, so the counters cost
+       almost nothing; with a process pool the worker counters are summed into the rank (cpu seconds)
+    3. report: one row per (rank, stage) plus the peak RSS of the rank and of its pool workers,
+       written as .json or .csv, rank 0 also prints max / mean seconds per stage (imbalance);
+       the pool is still alive when the report is written, so every worker sends its own peak RSS
+       back with its counters instead of relying on RUSAGE_CHILDREN
+    4. no mpi4py import: pool workers fill StageStats objects too
+  @Date: File created in 15:10-2026/10/21
+  @Modified by:
+  @Version: V1.0
+"""
+import csv
+import json
+import resource
+import socket
+import time
+from contextlib import contextmanager
+
+STAGES = ('read', 'parse', 'bucket', 'aggregate', 'communicate', 'merge', 'output')
+FIELDS = ('seconds', 'bytes', 'lines', 'failures')
+
+
+class StageStats:
+    """ seconds / bytes / lines / failures per stage of one rank (or one pool worker) """
+
+    def __init__(self):
+        self.counters = {stage: dict.fromkeys(FIELDS, 0) for stage in STAGES}
+        self.pool_peak_rss_mb = 0.0  # largest peak RSS a pool worker reported
+
+    def add(self, stage, seconds=0.0, bytes=0, lines=0, failures=0):
+        counter = self.counters[stage]
+        counter['seconds'] += seconds
+        counter['bytes'] += bytes
+        counter['lines'] += lines
+        counter['failures'] += failures
+
+    @contextmanager
+    def stage(self, stage, **counts):
+        """ time a with-block as stage """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, **counts)
+
+    def merge(self, other):
+        """ add the counters of a pool worker, keep the largest worker peak RSS """
+        for stage, counter in other.counters.items():
+            self.add(stage, **counter)
+        self.pool_peak_rss_mb = max(self.pool_peak_rss_mb, other.pool_peak_rss_mb)
+
+    def record_worker_rss(self):
+        """ called inside a pool worker: its peak RSS so far goes back to the rank with the counters """
+        self.pool_peak_rss_mb = max(self.pool_peak_rss_mb, peak_rss_mb()[0])
+
+
+def peak_rss_mb():
+    """ (peak RSS of this process, largest peak RSS of its finished children) in MB, linux reports KB """
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+
+
+def report_rows(stats, rank):
+    rss, children_rss = peak_rss_mb()
+    # finished children (none while the pool lives) or the peaks the live workers reported
+    children_rss = max(children_rss, stats.pool_peak_rss_mb)
+    host = socket.gethostname()
+    return [dict(rank=rank, host=host, stage=stage, **counter, peak_rss_mb=round(rss, 1),
+                 children_peak_rss_mb=round(children_rss, 1))
+            for stage, counter in stats.counters.items()]
+
+
+def write_report(comm, stats, path, root=0):
+    """ collective: gather every rank's rows, root writes path (.csv or .json) and prints a summary """
+    rows = comm.gather(report_rows(stats, comm.Get_rank()), root=root)
+    if comm.Get_rank() != root:
+        return
+    rows = [row for rank_rows in rows for row in rank_rows]
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'ranks': comm.Get_size(), 'stages': STAGES, 'rows': rows}, f, indent=2)
+
+    print(f"\nStage report ({path}):")
+    print(f"{'stage':<12}{'max s':>9}{'mean s':>9}{'imbalance':>11}{'lines':>12}{'MB':>10}{'failures':>10}")
+    for stage in STAGES:
+        stage_rows = [row for row in rows if row['stage'] == stage]
+        seconds = [row['seconds'] for row in stage_rows]
+        mean = sum(seconds) / len(seconds)
+        print(f"{stage:<12}{max(seconds):>9.2f}{mean:>9.2f}{max(seconds) / mean if mean else 1.0:>10.2f}x"
+              f"{sum(row['lines'] for row in stage_rows):>12}{sum(row['bytes'] for row in stage_rows) / 2 ** 20:>10.1f}"
+              f"{sum(row['failures'] for row in stage_rows):>10}")
+    print(f"peak RSS per rank: max {max(row['peak_rss_mb'] for row in rows):.1f} MB")
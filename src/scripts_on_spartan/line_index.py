@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: line_index.py
+  @Contact: 228077gy@gmail.com
+  @Description: sidecar index of record start offsets of an ndjson file (<filename>.idx.npz)
+    1. build: every rank finds the record starts of its byte range with one vectorised newline search
+       per block, an exscan of the counts gives global record numbers, every stride-th start is kept
+    2. record_ranges() cuts the file at indexed record starts -> record-balanced splits (within one
+       stride) whose boundaries are exact line starts, no skip of a half line needed
+    3. read_record() jumps to record i through the sample before it and skips at most stride - 1 lines
+    4. the index stores the input fingerprint (size, mtime, sampled hash) and is ignored once stale
+    5. usage: mpiexec -n 8 python line_index.py build large-144G.ndjson [--stride 1024]
+              python line_index.py show large-144G.ndjson 0 123456
+  @Date: File created in 10:00-2026/10/20
+  @Modified by:
+  @Version: V1.0
+"""
+import argparse
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from column_cache import fingerprint
+from mmap_reader import BLOCK_SIZE, iter_blocks, open_mmap, split_ranges
+
+DEFAULT_STRIDE = 1024  # one sampled offset every 1024 records, ~8 bytes per 1024 lines on disk
+NEWLINE = ord('\n')
+
+# offsets[j] = start offset of record j * stride
+LineIndex = namedtuple('LineIndex', ['offsets', 'stride', 'records', 'file_size'])
+
+
+def index_path(filename):
+    return filename + '.idx.npz'
+
+
+def record_starts(mm, start, end, block_size=BLOCK_SIZE):
+    """ int64 start offsets of the records (non-empty lines) whose first byte lies in [start, end) """
+    parts = []
+    for block_start, block_end in iter_blocks(mm, start, end, block_size):
+        block = np.frombuffer(mm[block_start:block_end], dtype=np.uint8)
+        starts = np.concatenate([[0], np.flatnonzero(block == NEWLINE) + 1])
+        # drop the position after the last newline and the starts of empty lines, like iter_lines
+        starts = starts[starts < len(block)]
+        parts.append(starts[block[starts] != NEWLINE] + block_start)
+    return np.concatenate(parts).astype(np.int64) if parts else np.empty(0, np.int64)
+
+
+def build_index(comm, filename, stride=DEFAULT_STRIDE, path=None):
+    """ collective: build and save the index of filename, returns it on every rank """
+    rank, size = comm.Get_rank(), comm.Get_size()
+    file_size = os.path.getsize(filename)
+    start, end = split_ranges(file_size, size)[rank]
+    with open_mmap(filename) as mm:
+        starts = record_starts(mm, start, end)
+
+    # global number of this rank's first record, keep the starts of records j * stride
+    base = comm.exscan(len(starts)) or 0
+    sampled = comm.gather(starts[(-base) % stride::stride], root=0)
+    records = comm.allreduce(len(starts))
+
+    index = None
+    if rank == 0:
+        index = LineIndex(np.concatenate(sampled), stride, records, file_size)
+        np.savez(path or index_path(filename), offsets=index.offsets, stride=stride, records=records,
+                 file_size=file_size, fingerprint=json.dumps(fingerprint(filename)))
+    return comm.bcast(index, root=0)
+
+
+def load_index(filename, path=None):
+    """ the index of filename, None if there is none or the file changed since it was built """
+    try:
+        with np.load(path or index_path(filename)) as data:
+            if json.loads(str(data['fingerprint'])) != fingerprint(filename):
+                return None
+            return LineIndex(data['offsets'], int(data['stride']), int(data['records']), int(data['file_size']))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def record_ranges(index, parts):
+    """ [start, end) byte ranges holding about records / parts records each, cut at record starts """
+    if not len(index.offsets):
+        return split_ranges(index.file_size, parts)
+    cuts = [0]
+    for i in range(1, parts):
+        sample = min(round(i * index.records / parts / index.stride), len(index.offsets) - 1)
+        cuts.append(max(int(index.offsets[sample]), cuts[-1]))
+    cuts.append(index.file_size)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def read_record(mm, index, i):
+    """ raw bytes of record i (0-based, empty lines are not records) """
+    if not 0 <= i < index.records:
+        raise IndexError(f"record {i} out of range, the file has {index.records} records")
+    sample, skip = divmod(i, index.stride)
+    pos = int(index.offsets[sample])
+    for _ in range(skip):
+        pos = mm.find(b'\n', pos) + 1
+        while mm[pos:pos + 1] == b'\n':
+            pos += 1
+    nl = mm.find(b'\n', pos)
+    return mm[pos:len(mm) if nl == -1 else nl]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='record offset index of an ndjson file')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build the index (run under mpiexec)')
+    build.add_argument('filename')
+    build.add_argument('--stride', type=int, default=DEFAULT_STRIDE, help='records between two sampled offsets')
+    show = commands.add_parser('show', help='print records by number')
+    show.add_argument('filename')
+    show.add_argument('records', type=int, nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from mpi4py import MPI
+        comm = MPI.COMM_WORLD
+        start_time = MPI.Wtime()
+        index = build_index(comm, args.filename, args.stride)
+        if comm.Get_rank() == 0:
+            print(f"Indexed {index.records} records of {args.filename} ({len(index.offsets)} offsets) "
+                  f"in {MPI.Wtime() - start_time:.2f} seconds")
+        return
+
+    index = load_index(args.filename)
+    if index is None:
+        parser.error(f"no valid index for {args.filename}, run 'line_index.py build' first")
+    with open_mmap(args.filename) as mm:
+        for i in args.records:
+            print(read_record(mm, index, i).decode('utf-8', errors='replace'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: local_scan.py
+  @Contact: 228077gy@gmail.com
+  @Description: scan of one byte range inside a rank, optionally spread over a local process pool
+    1. scan_range() -- read, parse and bucket one [start, end) range into hour / user sums
+    2. scan_range_pool() -- hybrid MPI + process pool: the rank range is cut into pieces, pool workers
+       scan them and the partial sums are merged locally, so only one dict pair per rank is gathered;
+       the pool comes from worker_pool() once per rank and is reused by every range the rank scans
+    3. this module never imports mpi4py: pool workers are forked from the rank and must not touch MPI
+    4. a block is split into lines, then parsed, bucketed and aggregated as three passes over batches of
+       BATCH_LINES, with a StageStats (--report) each pass is timed once per batch, without one the clocks
+       are skipped; the per-pass lists only ever hold one batch
+    5. --hours numpy: hour sums go into a HourHistogram, a batch's hours are folded with np.bincount
+    6. --users sketch: user sums go into a fixed-size UserSketch, fed like a UserAccumulator
+    7. --users spill: exact user sums in a SpillAggregator that writes sorted runs to scratch past a budget
+    8. blocks come from compressed_input.read_blocks: mmap blocks of plain text, or the
+       line-aligned blocks of the decompressed frames of a seekable .ndjson.gz / .ndjson.zst
+    9. --reader prefetch: plain text is read ahead by a background thread (prefetch_reader.py), with
+       --reader mpiio the rank reads its slice itself (mpiio_reader.py) and hands the blocks in
+  @Date: File created in 10:15-2026/10/18
+  @Modified by:
+  @Version: V1.0
+"""
+import multiprocessing
+import os
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from hour_bucket import epoch_hour
+from hour_histogram import HourHistogram
+from compressed_input import read_blocks
+from instrumentation import StageStats
+from mmap_reader import BLOCK_SIZE, split_span
+from prefetch_reader import PREFETCH_MB
+from record_parser import get_parser
+from spill_aggregator import SPILL_MB, SpillAggregator
+from user_accumulator import UserAccumulator
+from user_sketch import SKETCH_MB, UserSketch
+
+BATCH_LINES = 4096  # lines per parse / bucket / aggregate pass
+PIECES_PER_WORKER = 4  # more pieces than workers -> a slow piece does not hold the whole pool
+USER_MODES = ('dict', 'numpy', 'sketch', 'spill')
+USER_OBJECTS = (UserAccumulator, UserSketch, SpillAggregator)  # fed with add(user_id, username, sentiment)
+HOUR_MODES = ('dict', 'numpy')
+NO_RECORD = (None, None, None, None)  # what a parser returns for an unparsable line
+
+# how a range is scanned, shared by the rank and its pool workers (picklable)
+ScanOptions = namedtuple('ScanOptions', ['parser', 'decoder', 'block_size', 'users', 'hours', 'sketch_mb',
+                                         'spill_mb', 'spill_dir', 'reader', 'prefetch_mb'],
+                         defaults=['json', 'json', BLOCK_SIZE, 'dict', 'dict', SKETCH_MB, SPILL_MB, None,
+                                   'mmap', PREFETCH_MB])
+
+
+def default_workers():
+    """ pool size of a rank: the cpus SLURM gave to each task (1 when not set) """
+    return int(os.environ.get('SLURM_CPUS_PER_TASK', 1))
+
+
+def new_users(options=ScanOptions()):
+    """ empty user accumulator: username dict, numpy arrays by account id, fixed-size sketch or spilling dict """
+    if options.users == 'numpy':
+        return UserAccumulator()
+    if options.users == 'sketch':
+        return UserSketch(options.sketch_mb)
+    if options.users == 'spill':
+        return SpillAggregator(options.spill_mb, options.spill_dir)
+    return defaultdict(float)
+
+
+def new_sums(options=ScanOptions()):
+    """ empty (hour_sentiment, user_sentiment) accumulators, dict or numpy histogram / arrays """
+    return HourHistogram() if options.hours == 'numpy' else defaultdict(float), new_users(options)
+
+
+def _no_clock():
+    return 0.0
+
+
+def scan_range(filename, start, end, options=ScanOptions(), sums=None, stats=None, blocks=None):
+    """ hour / user sentiment sums of the lines whose first byte lies in [start, end), added to sums if given;
+        stats: a StageStats (--report) that gets the read / parse / bucket / aggregate time of every batch,
+        None = untimed; blocks: the text blocks of that range when the rank already reads them itself
+        (MPI-IO reader) """
+    parse_line = get_parser(options.parser, options.decoder)
+    hour_sentiment, user_sentiment = sums if sums is not None else new_sums(options)
+    add_user = user_sentiment.add if isinstance(user_sentiment, USER_OBJECTS) else None
+    histogram = isinstance(hour_sentiment, HourHistogram)
+    clock = time.perf_counter if stats is not None else _no_clock
+
+    if blocks is None:
+        blocks = read_blocks(filename, start, end, options.block_size, options.reader, options.prefetch_mb)
+    blocks = iter(blocks)
+    while True:
+        # read = slicing the mmap or decompressing a frame, plus the line split
+        t0 = clock()
+        block = next(blocks, None)
+        if block is None:
+            break
+        lines = block.split(b'\n')
+        if stats is not None:
+            stats.add('read', clock() - t0, bytes=len(block))
+        # the passes run over small batches, only the line split of the block is held in full
+        for first in range(0, len(lines), BATCH_LINES):
+            t1 = clock()
+            batch = [line for line in lines[first:first + BATCH_LINES] if line]
+            parsed = [parse_line(line) for line in batch]
+            t2 = clock()
+            records = [p for p in parsed if p[0] and p[1] is not None and p[2] and p[3]]
+            # 整数 epoch hour 作为 key，只有最后输出的 top 5 才格式化成字符串
+            hours = [epoch_hour(p[0]) for p in records]
+            t3 = clock()
+            if histogram:
+                # 整批的 hour 一次 bincount
+                kept = [(hour, p[1]) for hour, p in zip(hours, records) if hour is not None]
+                hour_sentiment.add_batch(np.array([k[0] for k in kept], dtype=np.int64),
+                                         np.array([k[1] for k in kept], dtype=np.float64))
+            for hour, (_, sentiment, user_id, username) in zip(hours, records):
+                if hour is None:
+                    continue
+                if not histogram:
+                    hour_sentiment[hour] += sentiment
+                if add_user is None:
+                    user_sentiment[username] += sentiment
+                else:
+                    add_user(user_id, username, sentiment)
+            t4 = clock()
+            if stats is not None:
+                stats.add('read', lines=len(batch))
+                stats.add('parse', t2 - t1, lines=len(batch), failures=parsed.count(NO_RECORD))
+                stats.add('bucket', t3 - t2, lines=len(records), failures=hours.count(None))
+                stats.add('aggregate', t4 - t3, lines=len(records) - hours.count(None))
+    if add_user is not None:
+        t0 = clock()
+        user_sentiment.flush()
+        if stats is not None:
+            stats.add('aggregate', clock() - t0)
+    return hour_sentiment, user_sentiment
+
+
+def _scan_piece(filename, start, end, options, timed):
+    """ pool task: the sums of one piece and its stage counters (None when untimed) """
+    stats = StageStats() if timed else None
+    hours, users = scan_range(filename, start, end, options, stats=stats)
+    if stats is not None:
+        stats.record_worker_rss()
+    return hours, users, stats
+
+
+def merge_sums(total, part):
+    """ add the sums of part into total (a defaultdict(float), HourHistogram or one of USER_OBJECTS) """
+    if isinstance(total, USER_OBJECTS + (HourHistogram,)):
+        total.merge(part)
+        return
+    for key, value in part.items():
+        total[key] += value
+
+
+def worker_pool(workers):
+    """ the local process pool of a rank, created once and shut down by the caller """
+    # fork: a spawned child would re-import the main script and initialise MPI again
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+
+
+def scan_range_pool(filename, start, end, pool, workers, options=ScanOptions(), sums=None, stats=None):
+    """ scan_range() of [start, end) spread over pool, a worker_pool(workers) """
+    hour_sentiment, user_sentiment = sums if sums is not None else new_sums(options)
+    pieces = split_span(start, end, workers * PIECES_PER_WORKER)
+    futures = [pool.submit(_scan_piece, filename, piece_start, piece_end, options, stats is not None)
+               for piece_start, piece_end in pieces]
+    # merge in piece order, the float sums do not depend on which worker finished first
+    for future in futures:
+        hours, users, piece_stats = future.result()
+        merge_sums(hour_sentiment, hours)
+        merge_sums(user_sentiment, users)
+        if piece_stats is not None:
+            stats.merge(piece_stats)
+    return hour_sentiment, user_sentiment
@@ -1,94 +1,305 @@
 from mpi4py import MPI
-import json
-from datetime import datetime
+import argparse
+import os
 from collections import defaultdict
+from hour_bucket import format_hour
+from decoders import DECODER_CHOICES, resolve_decoder
+from record_parser import PARSERS
+from local_scan import HOUR_MODES, USER_MODES, ScanOptions, default_workers, new_sums, scan_range, scan_range_pool, \
+    worker_pool
+from scheduler import PIECES_PER_RANK, SCHEDULERS, get_ranges
+from reduction import EXCHANGES, REDUCERS, reduce_hour_histogram, reduce_hours, reduce_users
+from hour_histogram import merge_histograms
+from user_accumulator import reduce_user_arrays
+from user_sketch import SKETCH_MB, reduce_user_sketch
+from spill_aggregator import SPILL_MB, reduce_spilled_users
+from column_cache import load_meta, scan_cache
+from compressed_input import READERS, codec_of, ensure_frame_index
+from prefetch_reader import PREFETCH_MB
+from mpiio_reader import MPIIO_READERS, mpiio_blocks, parse_hints
+from line_index import load_index
+from incremental import incremental_scan, local_top_users, state_path
+from checkpoint import CHECKPOINT_INTERVAL, checkpoint_key, checkpoint_path, checkpointed_scan, remove_checkpoint
+from instrumentation import StageStats, write_report
+from query_engine import QUERIES, builtin_spec, gather_query_sums, new_query_sums, print_queries, scan_queries, \
+    scan_queries_pool, write_query_tables
+from query_spec import load_spec
 
-def parse_line(line):
+def parse_args():
+    parser = argparse.ArgumentParser(description='Mastodon sentiment analysis, MPI file slicing version')
+    parser.add_argument('filename', nargs='?', default='large-144G.ndjson', help='ndjson input file')
+    parser.add_argument('--parser', choices=sorted(PARSERS), default='json',
+                        help='json: full json.loads per line; fast: projection of the four used fields')
+    parser.add_argument('--decoder', choices=DECODER_CHOICES, default='json',
+                        help='backend of the full decode (json, orjson, msgspec, auto = fastest installed)')
+    parser.add_argument('--workers', type=int, default=default_workers(),
+                        help='local process pool per rank (default: SLURM_CPUS_PER_TASK, 1 = no pool)')
+    parser.add_argument('--scheduler', choices=SCHEDULERS, default='static',
+                        help='static: one slice per rank; dynamic: small pieces handed out on demand')
+    parser.add_argument('--pieces-per-rank', type=int, default=PIECES_PER_RANK,
+                        help='number of pieces per rank for the dynamic scheduler')
+    parser.add_argument('--reduce', choices=REDUCERS, default='gather',
+                        help='gather: all user dicts to rank 0; shuffle: hash-partitioned alltoall, top-k per shard')
+    parser.add_argument('--exchange', choices=EXCHANGES, default='pickle',
+                        help='pickle: dicts; binary: dense hour array Reduce(SUM) + sorted user key / value arrays')
+    parser.add_argument('--users', choices=USER_MODES, default='dict',
+                        help='dict: sums keyed by username; numpy: int32-interned account ids, float64 arrays; '
+                             'sketch: approximate, fixed memory Count-Min sketch + top / bottom candidates; '
+                             'spill: exact username sums, sorted runs spilled to scratch past --spill-mb')
+    parser.add_argument('--sketch-mb', type=float, default=SKETCH_MB,
+                        help='memory budget per rank of --users sketch, in MB')
+    parser.add_argument('--spill-mb', type=float, default=SPILL_MB,
+                        help='in-memory user dict budget of --users spill per rank / pool worker, in MB')
+    parser.add_argument('--spill-dir', default=None,
+                        help='scratch directory of --users spill (default: $TMPDIR, node-local on Spartan)')
+    parser.add_argument('--hours', choices=HOUR_MODES, default='dict',
+                        help='dict: sums keyed by epoch hour; numpy: dense histogram folded per batch with np.bincount')
+    parser.add_argument('--reader', choices=READERS + MPIIO_READERS, default='mmap',
+                        help='mmap: map the file, blocks are sliced on demand; prefetch: a background thread per '
+                             'scanning process reads ahead (fadvise + pread) while the lines are parsed; '
+                             'mpiio: collective MPI-IO reads (Iread_at_all) of the static slices, line ends '
+                             'fixed up by a halo exchange; mpiio-independent: the same with Iread_at')
+    parser.add_argument('--prefetch-mb', type=float, default=PREFETCH_MB,
+                        help='read-ahead buffer budget of --reader prefetch per scanning process, in MB')
+    parser.add_argument('--mpiio-hints', default='', metavar='KEY=VALUE,...',
+                        help='MPI-IO hints of --reader mpiio, e.g. cb_nodes=4,cb_buffer_size=16777216,'
+                             'striping_unit=1048576,romio_cb_read=enable')
+    parser.add_argument('--cache-dir', default=None,
+                        help='column cache written by column_cache.py (default: <filename>.cols)')
+    parser.add_argument('--no-cache', action='store_true', help='always scan the ndjson text')
+    parser.add_argument('--index', default=None,
+                        help='line index written by line_index.py (default: <filename>.idx.npz)')
+    parser.add_argument('--no-index', action='store_true', help='split on bytes even if a line index exists')
+    parser.add_argument('--checkpoint', default=None, metavar='DIR',
+                        help='save / resume per-rank offsets and partial sums in DIR (static scheduler only)')
+    parser.add_argument('--checkpoint-interval', type=float, default=CHECKPOINT_INTERVAL,
+                        help='seconds between two checkpoints')
+    parser.add_argument('--incremental', action='store_true',
+                        help='scan only the bytes appended since the last --incremental run and merge them')
+    parser.add_argument('--state', default=None, help='state file of --incremental (default: <filename>.state)')
+    parser.add_argument('--report', default=None, metavar='PATH',
+                        help='per-rank, per-stage time / bytes / lines / failures / peak RSS report (.json or .csv)')
+    parser.add_argument('--query', nargs='+', choices=sorted(QUERIES), default=None, metavar='QUERY',
+                        help=f'fused scan: compute all these aggregations in one pass instead of the hour / user '
+                             f'report ({", ".join(QUERIES)})')
+    parser.add_argument('--spec', default=None, metavar='SPEC',
+                        help='declarative group-by queries (.json / .yaml file or inline json, see query_spec.py), '
+                             'computed in the same fused scan')
+    parser.add_argument('--query-out', default=None, metavar='DIR',
+                        help='with --query / --spec: write every full table to DIR/<query>.csv')
+    args = parser.parse_args()
     try:
-        data = json.loads(line)
-        doc = data.get('doc', {})
-        created_at = doc.get('createdAt', None)
-        sentiment = doc.get('sentiment', None)
-        account = doc.get('account', {})
-        user_id = account.get('id', None)
-        username = account.get('username', None)
-        return created_at, sentiment, user_id, username
-    except json.JSONDecodeError:
-        return None, None, None, None
+        args.spec = (builtin_spec(args.query) if args.query else []) + (load_spec(args.spec) if args.spec else [])
+    except ValueError as e:
+        parser.error(f'--spec: {e}')
+    if len({query['name'] for query in args.spec}) < len(args.spec):
+        parser.error('--spec query names must differ from each other and from the --query names')
+    if args.users != 'dict' and args.reduce != 'gather':
+        parser.error(f'--users {args.users} has its own reduction, leave --reduce at gather')
+    if args.users == 'spill' and (args.checkpoint or args.incremental):
+        parser.error('--users spill keeps run files in scratch, it cannot be saved with --checkpoint / --incremental')
+    if args.checkpoint and args.scheduler != 'static':
+        parser.error('--checkpoint needs --scheduler static, dynamic pieces are not owned by a fixed rank')
+    if args.spec and (args.checkpoint or args.incremental):
+        parser.error('--query / --spec scan the whole text, they can not be combined with --checkpoint / --incremental')
+    if args.checkpoint and args.incremental:
+        parser.error('--incremental already scans only the new tail, drop --checkpoint')
+    if codec_of(args.filename):
+        if args.incremental:
+            parser.error('--incremental appends plain text, it can not read a compressed input')
+        # 压缩输入按帧切分，列缓存和行索引都是按明文字节建的
+        args.no_cache = args.no_index = True
+    try:
+        args.mpiio_hints = parse_hints(args.mpiio_hints)
+    except ValueError as e:
+        parser.error(f'--mpiio-hints: {e}')
+    if args.reader in MPIIO_READERS:
+        # 集合读：每个 rank 读一个固定的相连区间，所有 rank 一起调用
+        if args.scheduler != 'static' or args.workers > 1:
+            parser.error(f'--reader {args.reader} reads the static slice of every rank collectively, '
+                         f'use --scheduler static and --workers 1')
+        if args.checkpoint or args.incremental or codec_of(args.filename):
+            parser.error(f'--reader {args.reader} reads whole plain-text slices, it can not be combined with '
+                         f'--checkpoint / --incremental or a compressed input')
+    return args
 
-def main():
+def read_slice(filename, start, end, args, block_size):
+    """ --reader mpiio: the text blocks of this rank's slice, read together with every other rank """
+    return mpiio_blocks(MPI.COMM_WORLD, filename, start, end, block_size, args.mpiio_hints,
+                        collective=args.reader == 'mpiio')
+
+def scan_piece(filename, start, end, args, options, sums, stats=None, pool=None):
+    if pool is not None:
+        # hybrid 模式：rank 内再用进程池并行，部分结果先在本地合并再 gather
+        scan_range_pool(filename, start, end, pool, args.workers, options, sums=sums, stats=stats)
+    elif args.reader in MPIIO_READERS:
+        blocks = read_slice(filename, start, end, args, options.block_size)
+        scan_range(filename, start, end, options, sums=sums, stats=stats, blocks=blocks)
+    else:
+        scan_range(filename, start, end, options, sums=sums, stats=stats)
+
+def load_frames(comm, filename):
+    """ compressed input: rank 0 loads (or builds once) the frame index, every rank gets the frame count """
+    frames = None
+    if comm.Get_rank() == 0:
+        try:
+            frames = len(ensure_frame_index(filename).sizes)
+        except (OSError, ValueError) as e:
+            frames = str(e)
+    return comm.bcast(frames, root=0)
+
+def run_queries(comm, args, block_size, stats, pool=None):
+    """ --query / --spec: every aggregation from one scan of the text, printed (and written) by rank 0 """
+    rank = comm.Get_rank()
+    filename = args.filename
+    sums = new_query_sums(args.spec)
+    index = None if args.no_index else comm.bcast(load_index(filename, args.index) if rank == 0 else None, root=0)
+    for start, end in get_ranges(comm, os.path.getsize(filename), args.scheduler, args.pieces_per_rank, index):
+        if pool is not None:
+            scan_queries_pool(filename, start, end, args.spec, pool, args.workers, args.decoder, block_size, sums,
+                              args.reader, args.prefetch_mb, stats)
+        elif args.reader in MPIIO_READERS:
+            scan_queries(filename, start, end, args.spec, args.decoder, block_size, sums,
+                         blocks=read_slice(filename, start, end, args, block_size))
+        else:
+            scan_queries(filename, start, end, args.spec, args.decoder, block_size, sums, args.reader, args.prefetch_mb)
+
+    with stats.stage('communicate'):
+        total = gather_query_sums(comm, args.spec, sums, root=0)
+    if rank == 0:
+        with stats.stage('output'):
+            print_queries(args.spec, total)
+            if args.query_out:
+                write_query_tables(args.spec, total, args.query_out)
+                print(f"\nTables written to {args.query_out}")
+    if args.report:
+        write_report(comm, stats, args.report, root=0)
+
+def analyse(args, pool=None):
     comm = MPI.COMM_WORLD
     rank = comm.Get_rank()
     size = comm.Get_size()
+    if rank == 0:
+        print(f"Parser: {args.parser}, decoder: {resolve_decoder(args.decoder)}, "
+              f"ranks: {size}, workers per rank: {args.workers}")
 
     # 每个进程处理文件的一部分
-    filename = 'large-144G.ndjson'
-    chunk_size = 1024 * 1024 * 100  # 每次读取100MB
-
-    hour_sentiment = defaultdict(float)
-    user_sentiment = defaultdict(float)
-
-    with open(filename, 'r', encoding='utf-8') as f:
-        # 将文件划分为多个部分，每个进程负责其中一部分
-        f.seek(0, 2)  # 移动到文件末尾
-        file_size = f.tell()
-        chunk_size = file_size // size
-        start = rank * chunk_size
-        end = start + chunk_size if rank != size -1 else file_size
-
-        f.seek(start)
-        # 如果不是第一个进程，跳过当前行以避免部分读取
-        if rank != 0:
-            f.readline()
-
-        pos = f.tell()
-        while pos < end:
-            line = f.readline()
-            if not line:
-                break
-            pos = f.tell()
-            created_at, sentiment, user_id, username = parse_line(line)
-            if created_at and sentiment is not None and user_id and username:
-                try:
-                    dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    hour = dt.strftime('%Y-%m-%d %H:00')
-                    hour_sentiment[hour] += sentiment
-                    user_sentiment[username] += sentiment
-                except ValueError:
-                    continue
-
-    # 收集所有进程的结果
-    all_hour_sentiment = comm.gather(hour_sentiment, root=0)
-    all_user_sentiment = comm.gather(user_sentiment, root=0)
+    filename = args.filename
+    block_size = 1024 * 1024 * 100  # 每次映射100MB
+    options = ScanOptions(args.parser, args.decoder, block_size, args.users, args.hours, args.sketch_mb,
+                          args.spill_mb, args.spill_dir, args.reader, args.prefetch_mb)
+    if codec_of(filename):
+        # 各 rank 按压缩字节切分，一帧属于其首字节所在的区间，帧在各自的 rank 里并行解压
+        frames = load_frames(comm, filename)
+        if isinstance(frames, str):
+            if rank == 0:
+                print(f"Compressed input: {frames}")
+            return
+        if rank == 0:
+            print(f"Compressed input: {frames} {codec_of(filename)} frames")
+            if frames == 1 and size * args.workers > 1:
+                # 单成员 gzip 只能由一个 rank 流式解压，其余进程空闲
+                print(f"Warning: {filename} is a single frame, one rank decompresses all of it; recompress it "
+                      f"with 'compressed_input.py convert' to read it in parallel")
+    # 各阶段计时，只有 --report 时扫描才按块分阶段计时
+    stats = StageStats()
+    scan_stats = stats if args.report else None
+    if args.spec:
+        # 一次扫描同时计算所有查询，读和解析只付一次
+        run_queries(comm, args, block_size, stats, pool)
+        return
+
+    # 将文件划分为多个部分，static 每个进程负责其中一部分，dynamic 按需领取小块
+    # 行归属于其首字节所在的区间，不需要 readline() 跳过半行
+    hour_sentiment, user_sentiment = new_sums(options)
+    # 有效的列缓存（size、mtime、抽样 hash 都对得上）直接读 memmap 列，不再解析 json
+    use_cache = not args.no_cache and not args.incremental
+    meta = comm.bcast(load_meta(filename, args.cache_dir) if rank == 0 else None, root=0) if use_cache else None
+    if args.incremental:
+        # 只解析上次运行之后追加的字节，前缀的抽样 hash 不变才信任保存的结果
+        offset, end, merged = incremental_scan(comm, filename, options,
+                                               lambda a, b, sums: scan_piece(filename, a, b, args, options, sums, scan_stats, pool),
+                                               args.state)
+        if rank == 0:
+            print(f"Incremental: scanned bytes [{offset}, {end}), state {args.state or state_path(filename)}")
+    elif meta is not None:
+        if rank == 0:
+            print(f"Column cache: {meta['dir']}")
+        with stats.stage('aggregate'):
+            scan_cache(meta, rank, size, hour_sentiment, user_sentiment)
+    else:
+        # 有行索引时按记录数切分，边界正好是行首
+        index = None if args.no_index else comm.bcast(load_index(filename, args.index) if rank == 0 else None, root=0)
+        if rank == 0 and index is not None:
+            print(f"Line index: {index.records} records, stride {index.stride}")
+        ranges = get_ranges(comm, os.path.getsize(filename), args.scheduler, args.pieces_per_rank, index)
+        for start, end in ranges:
+            if args.checkpoint:
+                # 定期保存已处理的偏移和部分结果，重启的作业从检查点继续
+                os.makedirs(args.checkpoint, exist_ok=True)
+                key = checkpoint_key(filename, size, start, end, options)
+                (hour_sentiment, user_sentiment), resumed_at = checkpointed_scan(
+                    checkpoint_path(args.checkpoint, rank), key, start, end, (hour_sentiment, user_sentiment),
+                    lambda a, b, sums: scan_piece(filename, a, b, args, options, sums, scan_stats, pool),
+                    args.checkpoint_interval)
+                if resumed_at is not None:
+                    print(f"Rank {rank} resumed from checkpoint at byte {resumed_at} of [{start}, {end})")
+            else:
+                scan_piece(filename, start, end, args, options, (hour_sentiment, user_sentiment), scan_stats, pool)
+
+    # 收集所有进程的结果，用户结果按 --reduce 归约，只有 top/bottom 5 到达 rank 0
+    communicate_start = MPI.Wtime()
+    if args.incremental:
+        # 合并后的完整结果已经在 rank 0
+        all_hour_sentiment = [merged[0]] if rank == 0 else None
+        user_result = local_top_users(merged[1], k=5) if rank == 0 else None
+    else:
+        if args.exchange == 'binary' and args.hours == 'numpy':
+            # 直方图的 sum、count、平方和三个数组一起 Reduce(SUM)，均值和方差不丢
+            hour_total = reduce_hour_histogram(comm, hour_sentiment, root=0)
+            all_hour_sentiment = [hour_total] if rank == 0 else None
+        elif args.exchange == 'binary':
+            # 小时结果是稠密 float64 数组，直接 Reduce(SUM)
+            hour_total = reduce_hours(comm, hour_sentiment, root=0)
+            all_hour_sentiment = [hour_total] if rank == 0 else None
+        else:
+            all_hour_sentiment = comm.gather(hour_sentiment, root=0)
+        if args.users == 'numpy':
+            user_result = reduce_user_arrays(comm, user_sentiment, k=5, root=0)
+        elif args.users == 'sketch':
+            # 近似模式：sketch 表 Reduce(SUM)，候选用户在 rank 0 上重新估计
+            user_result = reduce_user_sketch(comm, user_sentiment, k=5, root=0)
+        elif args.users == 'spill':
+            # 精确模式：一次只交换一个 hash 分区，分区 p 由 rank p % size 合并
+            user_result = reduce_spilled_users(comm, user_sentiment, k=5, root=0)
+        else:
+            user_result = reduce_users(comm, user_sentiment, args.reduce, k=5, root=0, exchange=args.exchange)
+    stats.add('communicate', MPI.Wtime() - communicate_start)
 
     if rank == 0:
+        merge_start = MPI.Wtime()
         combined_hour = defaultdict(float)
-        combined_user = defaultdict(float)
 
         for hs in all_hour_sentiment:
             for hour, sentiment in hs.items():
                 combined_hour[hour] += sentiment
 
-        for us in all_user_sentiment:
-            for user, sentiment in us.items():
-                combined_user[user] += sentiment
-
         # 获取5 happiest hours
         happiest_hours = sorted(combined_hour.items(), key=lambda x: x[1], reverse=True)[:5]
         # 获取5 saddest hours
         saddest_hours = sorted(combined_hour.items(), key=lambda x: x[1])[:5]
-        # 获取5 happiest users
-        happiest_users = sorted(combined_user.items(), key=lambda x: x[1], reverse=True)[:5]
-        # 获取5 saddest users
-        saddest_users = sorted(combined_user.items(), key=lambda x: x[1])[:5]
+        # 获取5 happiest / saddest users
+        happiest_users, saddest_users = user_result
+        stats.add('merge', MPI.Wtime() - merge_start, lines=len(combined_hour))
 
+        output_start = MPI.Wtime()
         print("5 Happiest Hours:")
         for hour, score in happiest_hours:
-            print(f"{hour} with sentiment score {score}")
+            print(f"{format_hour(hour)} with sentiment score {score}")
 
         print("\n5 Saddest Hours:")
         for hour, score in saddest_hours:
-            print(f"{hour} with sentiment score {score}")
+            print(f"{format_hour(hour)} with sentiment score {score}")
 
         print("\n5 Happiest Users:")
         for user, score in happiest_users:
@@ -98,5 +309,39 @@ def main():
         for user, score in saddest_users:
             print(f"{user} with sentiment score {score}")
 
+        if args.hours == 'numpy':
+            # 各 rank 的直方图带着 count 和平方和到了 rank 0，输出的小时再给出均值和方差
+            hour_stats = merge_histograms(all_hour_sentiment).stats()
+            print("\nHour statistics (records, mean, population variance):")
+            for hour, _ in happiest_hours + saddest_hours:
+                count, mean, variance = hour_stats[hour]
+                print(f"{format_hour(hour)}: {count} records, mean {mean:.4f}, variance {variance:.4f}")
+
+        if args.users == 'sketch':
+            bounds = (merged[1] if args.incremental else user_sentiment).error_bounds()
+            print(f"\nUser scores are estimates (sketch {bounds['depth']} x {bounds['width']}): with probability "
+                  f">= 1 - 2e^-{bounds['depth']} = {1 - bounds['delta']:.3f} per user (positive and negative "
+                  f"tables, union bound) the true score lies in "
+                  f"[score - {bounds['over']:.4g}, score + {bounds['under']:.4g}]")
+        stats.add('output', MPI.Wtime() - output_start)
+
+    if args.report:
+        write_report(comm, stats, args.report, root=0)
+
+    if args.checkpoint:
+        # 结果已输出，检查点作废
+        comm.Barrier()
+        remove_checkpoint(checkpoint_path(args.checkpoint, rank))
+
+def main():
+    args = parse_args()
+    # 每个 rank 只建一个进程池，dynamic 的小块、检查点的分段和查询都复用它，不再每个区间 fork 一次
+    pool = worker_pool(args.workers) if args.workers > 1 else None
+    try:
+        analyse(args, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,10 +1,21 @@
 # -*- coding: utf-8 -*-
-import json
 import sys
 import io
 from mpi4py import MPI
 from datetime import datetime
 import os
+from collections import deque
+import numpy as np
+
+
+# shared modules (record_parser ...) live in the parent scripts_on_spartan directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_parser import get_parser
+from hour_bucket import epoch_hour, format_hour
+from hour_histogram import HourHistogram, merge_histograms
+from reduction import decode_key, key_arrays, merge_arrays, merge_parts, shuffle_users
+from user_accumulator import top_bottom_arrays
+from instrumentation import StageStats, write_report
 
 """
   @Author: Garvyn-Yuan
@@ -44,74 +55,285 @@ DATA_PATH = "medium-16m.ndjson"
 # CHUNK_SIZE = 4 * 1024 * 1024 * 1024  # 4GB
 # DATA_PATH = "large-144G.ndjson"
 
+PARSER = "json"  # "json" -> full json.loads, "fast" -> field projection parser
+DECODER = "json"  # full decode backend: "json", "orjson", "msgspec" or "auto"
+parse_line = get_parser(PARSER, DECODER)
+# "gather": workers send their dicts to rank 0; "shuffle": users hash-partitioned over all ranks with
+# alltoall, each rank merges its shard and only the top/bottom 5 candidates reach rank 0
+REDUCE = "gather"
+# "pickle": workers send their dicts; "binary": sorted (key array, value array) pairs, rank 0 merges them
+# with np.unique + np.bincount instead of a python loop over every key
+EXCHANGE = "pickle"
+# "dict": hour sums updated one record at a time; "numpy": a chunk's epoch hours and sentiments are collected
+# into arrays and folded into a dense HourHistogram with np.bincount; the histogram itself goes to rank 0 (any
+# EXCHANGE / REDUCE), so its counts / squares give the mean and variance written next to the top / bottom hours
+HOURS = "dict"
+# per-rank, per-stage report written by rank 0 (.json or .csv), None = only the Wtime prints
+# workers parse, bucket and aggregate line by line, their whole chunk loop is counted as "parse"
+REPORT = None
+stats = StageStats()
+# "round_robin": blocking sends, every chunk is split over all workers in a fixed order
+# "on_demand": a chunk goes whole to the worker that asked first, isend on rank 0 and PREFETCH posted
+# irecv buffers per worker -> rank 0 reads on while chunks travel, a slow worker only delays itself
+DISTRIBUTE = "round_robin"
+PREFETCH = 2  # on_demand: chunks in flight per worker (2 = double buffering)
+STREAM_CHUNK_SIZE = CHUNK_SIZE // 4  # on_demand: size of one chunk, a worker buffer holds 2x that (pickle overhead)
+TAG_ASK = 3  # on_demand: worker -> rank 0 "send me the next chunk" (tag 1 = data, tag 2 = results)
+TAG_STOP = 4  # raw: empty termination message, an empty data piece (tag 1) is a valid chunk
+# "pickle": lists of decoded str lines with lowercase send / recv
+# "raw": rank 0 reads bytes, cuts them at newlines and ships them with uppercase Send / Recv (no decode,
+# re-encode, pickle or unpickle), workers parse straight from the received bytes
+TRANSFER = "pickle"
+RAW_BUFFER_SIZE = 2 * STREAM_CHUNK_SIZE  # on_demand + raw: size of a posted Irecv buffer
+
 # output stream to utf-8
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 
+def read_chunks(chunk_size):
+    """ rank 0 reads the file and yields lists of lines of about chunk_size bytes """
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        rank0_buffer = []
+        buffer_size = 0
+
+        read_start = MPI.Wtime()
+        for line in f:
+            rank0_buffer.append(line)
+            buffer_size += len(line.encode('utf-8'))  # cal chunk size by cumulating
+
+            # hit the limitation  - > send
+            if buffer_size >= chunk_size:
+                stats.add("read", MPI.Wtime() - read_start, bytes=buffer_size, lines=len(rank0_buffer))
+                yield rank0_buffer
+                rank0_buffer = []
+                buffer_size = 0
+                read_start = MPI.Wtime()
+
+        # send rest of the data
+        stats.add("read", MPI.Wtime() - read_start, bytes=buffer_size, lines=len(rank0_buffer))
+        if rank0_buffer:
+            yield rank0_buffer
+
+
 def load_data_chunk_stream():
     """ rank 0 read ,split and send """
     if rank == 0:
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            rank0_buffer = []
-            buffer_size = 0
+        if DISTRIBUTE == "on_demand":
+            stream_on_demand()
+            return
 
-            for line in f:
-                rank0_buffer.append(line)
-                buffer_size += len(line.encode('utf-8'))  # cal chunk size by cumulating
+        for data_chunk in read_any_chunks(CHUNK_SIZE):
+            send_data(data_chunk)
 
-                # hit the limitation  - > send
-                if buffer_size >= CHUNK_SIZE:
-                    send_data(rank0_buffer)
-                    rank0_buffer = []
-                    buffer_size = 0
+        # notify each subprocess when data transfer is done !!! -> so they can continue their work
+        with stats.stage("communicate"):
+            for serial_num in range(1, size):
+                send_chunk(None, serial_num)
 
-            # send rest of the data
-            if rank0_buffer:
-                send_data(rank0_buffer)
 
-        # notify each subprocess when data transfer is done !!! -> so they can continue their work
-        for serial_num in range(1, size):
-            comm.send(None, dest=serial_num, tag=1)
+def read_raw_chunks(chunk_size):
+    """ rank 0 reads raw bytes chunk_size at a time and yields chunks of whole lines of less than
+        2 * chunk_size bytes (the carried partial line + one read; longer only if one line is longer) """
+    with open(DATA_PATH, "rb") as f:
+        parts = []  # bytes read since the last line end, joined only once a newline arrives
+        read_start = MPI.Wtime()
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            cut = block.rfind(b"\n") + 1
+            if cut == 0:
+                parts.append(block)  # no line end yet, read on
+                continue
+            parts.append(block[:cut])
+            data = b"".join(parts)
+            parts = [block[cut:]]
+            stats.add("read", MPI.Wtime() - read_start, bytes=len(data), lines=data.count(b"\n"))
+            yield data
+            read_start = MPI.Wtime()
+        # last line without a newline
+        data = b"".join(parts)
+        if data:
+            stats.add("read", MPI.Wtime() - read_start, bytes=len(data), lines=1)
+            yield data
+
+
+def read_any_chunks(chunk_size):
+    """ raw byte chunks or lists of str lines, depending on TRANSFER """
+    return read_raw_chunks(chunk_size) if TRANSFER == "raw" else read_chunks(chunk_size)
+
+
+def chunk_length(data_chunk):
+    """ bytes of a raw chunk / lines of a line list, for the log """
+    return f"{len(data_chunk)} bytes" if TRANSFER == "raw" else f"{len(data_chunk)} lines"
+
+
+def chunk_counts(data_chunk):
+    """ StageStats counts of a chunk """
+    return {"bytes": len(data_chunk)} if TRANSFER == "raw" else {"lines": len(data_chunk)}
+
+
+def send_chunk(data_chunk, dest):
+    """ blocking send of one chunk, None = termination signal (an empty TAG_STOP message in raw mode) """
+    if TRANSFER == "raw":
+        if data_chunk is None:
+            comm.Send([b"", MPI.BYTE], dest=dest, tag=TAG_STOP)
+        else:
+            comm.Send([data_chunk, MPI.BYTE], dest=dest, tag=1)
+    else:
+        comm.send(data_chunk, dest=dest, tag=1)
+
+
+def isend_chunk(data_chunk, dest):
+    """ non-blocking send_chunk(), the request keeps a reference to the chunk until it completes """
+    if TRANSFER != "raw":
+        return comm.isend(data_chunk, dest=dest, tag=1)
+    if data_chunk is None:
+        return comm.Isend([b"", MPI.BYTE], dest=dest, tag=TAG_STOP)
+    if len(data_chunk) > RAW_BUFFER_SIZE:
+        raise ValueError(f"chunk of {len(data_chunk)} bytes does not fit the {RAW_BUFFER_SIZE} byte worker buffer")
+    return comm.Isend([data_chunk, MPI.BYTE], dest=dest, tag=1)
+
+
+def raw_lines(buffer, count):
+    """ non-empty lines of the first count bytes of a receive buffer (one copy, then a C level split) """
+    return [line for line in bytes(memoryview(buffer)[:count]).split(b"\n") if line]
+
+
+def stream_on_demand():
+    """ rank 0: every chunk goes to the worker whose ask arrives first, sends do not block the reader """
+    sent = [0] * size  # chunks sent to each worker
+    asked = [0] * size  # asks received from each worker
+    pending = []  # isend requests still in flight (they hold the chunks)
+
+    def next_asker():
+        with stats.stage("communicate"):
+            worker = comm.recv(source=MPI.ANY_SOURCE, tag=TAG_ASK)
+        asked[worker] += 1
+        return worker
+
+    for data_chunk in read_any_chunks(STREAM_CHUNK_SIZE):
+        worker = next_asker()
+        print(f"Rank 0 sending {chunk_length(data_chunk)} to Rank {worker}")
+        with stats.stage("communicate", **chunk_counts(data_chunk)):
+            pending.append(isend_chunk(data_chunk, worker))
+            sent[worker] += 1
+            pending = [request for request in pending if not request.Test()]
+
+    # every ask gets one reply: a worker asks PREFETCH times up front and once more per chunk it got
+    with stats.stage("communicate"):
+        while any(asked[worker] < PREFETCH + sent[worker] for worker in range(1, size)):
+            pending.append(isend_chunk(None, next_asker()))
+        MPI.Request.Waitall(pending)
+
+
+def receive_chunks():
+    """ worker: yield the chunks of rank 0 (as lists of lines) until the termination signal """
+    status = MPI.Status()
+    if DISTRIBUTE != "on_demand":
+        buffer = bytearray()
+        while True:
+            # print(f"Rank {rank} receiving data......")
+            with stats.stage("communicate"):
+                if TRANSFER != "raw":
+                    data_chunk = comm.recv(source=0, tag=1)
+                else:
+                    # the size of a raw chunk is only known from the probe, the buffer grows to the largest one
+                    # (messages of one sender arrive in order, so the stop can not overtake a data piece)
+                    comm.Probe(source=0, tag=MPI.ANY_TAG, status=status)
+                    tag, count = status.Get_tag(), status.Get_count(MPI.BYTE)
+                    if count > len(buffer):
+                        buffer = bytearray(count)
+                    comm.Recv([buffer, count, MPI.BYTE], source=0, tag=tag)
+                    data_chunk = None if tag == TAG_STOP else raw_lines(buffer, count)
+            if data_chunk is None:
+                return
+            yield data_chunk
+
+    # PREFETCH receives are posted before their asks, the next chunk arrives while this one is processed
+    # (a pickled irecv needs a buffer at least as large as the message)
+    buffers = [bytearray(RAW_BUFFER_SIZE if TRANSFER == "raw" else 2 * STREAM_CHUNK_SIZE + (1 << 20))
+               for _ in range(PREFETCH)]
+    receives = deque()
+    asks = []
+
+    def post(buffer):
+        if TRANSFER == "raw":
+            receives.append((comm.Irecv([buffer, MPI.BYTE], source=0, tag=MPI.ANY_TAG), buffer))
+        else:
+            receives.append((comm.irecv(buffer, source=0, tag=1), buffer))
+        asks.append(comm.isend(rank, dest=0, tag=TAG_ASK))
+
+    for buffer in buffers:
+        post(buffer)
+    while receives:
+        request, buffer = receives.popleft()
+        with stats.stage("communicate"):
+            if TRANSFER == "raw":
+                request.Wait(status)
+                count = status.Get_count(MPI.BYTE)
+                # lines are copied out of the buffer before it is posted again
+                data_chunk = None if status.Get_tag() == TAG_STOP else raw_lines(buffer, count)
+            else:
+                data_chunk = request.wait()
+        if data_chunk is None:
+            continue  # the other asks are answered with None too
+        post(buffer)
+        yield data_chunk
+    MPI.Request.Waitall(asks)
+
+
+def split_raw(data_chunk, parts):
+    """ cut a raw chunk of whole lines into parts zero-copy views at newline boundaries (a piece may be
+        empty when the chunk has fewer lines than parts, it is still sent as a data message) """
+    view = memoryview(data_chunk)
+    pieces = []
+    start = 0
+    for i in range(1, parts):
+        cut = data_chunk.find(b"\n", max(len(data_chunk) * i // parts - 1, start))
+        cut = len(data_chunk) if cut == -1 else cut + 1
+        pieces.append(view[start:cut])
+        start = cut
+    pieces.append(view[start:])
+    return pieces
 
 
 def send_data(data_chunk):
     """ send data to workers """
     num_workers = size - 1
     chunk_size = len(data_chunk) // num_workers
+    raw_pieces = split_raw(data_chunk, num_workers) if TRANSFER == "raw" else None
 
     for serial_num in range(1, size):
-        # start pointer
-        start = (serial_num - 1) * chunk_size
-        # end pointer
-        end = len(data_chunk) if serial_num == num_workers else serial_num * chunk_size
-        cur_data = data_chunk[start:end]
-        print(f"Rank 0 sending {len(cur_data)} lines to Rank {serial_num}")
-        comm.send(cur_data, dest=serial_num, tag=1)
+        if raw_pieces is not None:
+            cur_data = raw_pieces[serial_num - 1]
+        else:
+            # start pointer
+            start = (serial_num - 1) * chunk_size
+            # end pointer
+            end = len(data_chunk) if serial_num == num_workers else serial_num * chunk_size
+            cur_data = data_chunk[start:end]
+        print(f"Rank 0 sending {chunk_length(cur_data)} to Rank {serial_num}")
+        with stats.stage("communicate", **chunk_counts(cur_data)):
+            send_chunk(cur_data, serial_num)
 
 
 def process_and_aggregate():
     """ subprocess fetch data, process and send back """
-    while True:
-        # print(f"Rank {rank} receiving data......")
-        data_chunk = comm.recv(source=0, tag=1)
-        if data_chunk is None:
-            print(f"Rank {rank} received termination signal.")
-            break  # done
+    user_sentiments = {}  # user sentiment
+    hour_sentiments = HourHistogram() if HOURS == "numpy" else {}  # time sentiment（hour）
 
+    for data_chunk in receive_chunks():
         # print(f"Rank {rank} received {len(data_chunk)} entries")
         # comm.barrier()
 
-        user_sentiments = {}  # user sentiment
-        hour_sentiments = {}  # time sentiment（hour）
-
+        chunk_start = MPI.Wtime()
+        failures = 0
+        chunk_hours, chunk_sentiments = [], []
         for line in data_chunk:
             try:
-                # set default value to fill the empty position
-                data = json.loads(line).get("doc", {})
-                sentiment = data.get("sentiment", 0.00)
-                user_id = data.get("account", {}).get("id", "")
-                username = data.get("account", {}).get("username", "")
-                created_at = data.get("createdAt", None)
+                # PARSER: "json" -> full decode, "fast" -> projection of the four fields
+                created_at, sentiment, user_id, username = parse_line(line)
 
                 if not user_id or not username or sentiment is None:
                     continue
@@ -123,29 +345,84 @@ def process_and_aggregate():
                 user_sentiments[user_key] += sentiment
 
                 # cumulate by hour sentiment
-                if created_at:
-                    hour_key = created_at[:13]  # eg: "2023-11-23T15"
-                    if hour_key not in hour_sentiments:
-                        hour_sentiments[hour_key] = 0.0
-                    hour_sentiments[hour_key] += sentiment
+                hour_key = epoch_hour(created_at) if created_at else None  # eg: 482699 -> "2025-01-24 11:00"
+                if hour_key is not None:
+                    if HOURS == "numpy":
+                        chunk_hours.append(hour_key)
+                        chunk_sentiments.append(sentiment)
+                    else:
+                        if hour_key not in hour_sentiments:
+                            hour_sentiments[hour_key] = 0.0
+                        hour_sentiments[hour_key] += sentiment
 
-            except json.JSONDecodeError:
-                continue
             except Exception as e:
                 print(f"Error processing line: {e}")
+                failures += 1
                 continue
-
-        # send results to rank 0
+        if HOURS == "numpy":
+            # one bincount per chunk instead of one dict update per line
+            hour_sentiments.add_batch(np.array(chunk_hours, dtype=np.int64), np.array(chunk_sentiments))
+        stats.add("parse", MPI.Wtime() - chunk_start, lines=len(data_chunk), failures=failures)
+    print(f"Rank {rank} received termination signal.")
+
+    # sums of every chunk are kept until the end: gather_results() expects one result per worker
+    if REDUCE == "shuffle":
+        return user_sentiments, hour_sentiments
+    # send results to rank 0
+    if EXCHANGE == "binary":
+        # a HourHistogram is numpy arrays already
+        user_sentiments = key_arrays(user_sentiments)
+        if HOURS != "numpy":
+            hour_sentiments = key_arrays(hour_sentiments)
+    with stats.stage("communicate"):
         comm.send((user_sentiments, hour_sentiments), dest=0, tag=2)
+    return None, None
+
+
+def shuffle_results(user_sentiments, hour_sentiments):
+    """ all ranks: alltoall user shuffle, rank 0 gets the top/bottom 5 users and the hour sums """
+    user_result = shuffle_users(comm, user_sentiments or {}, k=5, root=0)
+    all_hours = comm.gather(hour_sentiments, root=0)
+    if rank != 0:
+        return None
+    happiest_users, saddest_users = user_result
+    # same order as the gather version: saddest users by descending score
+    if HOURS == "numpy":
+        return happiest_users, saddest_users[::-1], merge_histograms(h for h in all_hours if h is not None)
+    return happiest_users, saddest_users[::-1], merge_parts([h or {} for h in all_hours])
 
 
-def gather_results():
+def gather_results(shuffled=None):
     """ rank 0 collects all results and aggregate """
+    if shuffled is not None:
+        happiest_users, saddest_users, final_hour_sentiments = shuffled
+    else:
+        happiest_users, saddest_users, final_hour_sentiments = receive_results()
+
+    # happiest/saddest hours -- sort by score（the second term）
+    with stats.stage("merge"):
+        sorted_hours = sorted(final_hour_sentiments.items(), key=lambda x: x[1], reverse=True)
+    # print(sorted_hours)
+    happiest_hours = sorted_hours[:5]
+    saddest_hours = sorted_hours[-5:]
+
+    # HOURS == "numpy": counts and squares came along, mean / variance of the written hours
+    hour_stats = final_hour_sentiments.stats() if HOURS == "numpy" else None
+    with stats.stage("output"):
+        write_results(happiest_users, saddest_users, happiest_hours, saddest_hours, hour_stats)
+
+
+def receive_results():
+    """ rank 0 receives the dicts of every worker and merges them """
+    if EXCHANGE == "binary":
+        return receive_result_arrays()
     final_user_sentiments = {}
-    final_hour_sentiments = {}
+    final_hour_sentiments = HourHistogram() if HOURS == "numpy" else {}
 
     for serial_num in range(1, size):
-        user_data, hour_data = comm.recv(source=serial_num, tag=2)
+        with stats.stage("communicate"):
+            user_data, hour_data = comm.recv(source=serial_num, tag=2)
+        merge_start = MPI.Wtime()
         # print(user_data)
         # print(hour_data)
 
@@ -157,23 +434,47 @@ def gather_results():
             final_user_sentiments[user_key] += sentiment
 
         # aggregate hour data
-        for hour, sentiment in hour_data.items():
-            if hour not in final_hour_sentiments:
-                final_hour_sentiments[hour] = 0.0
-            final_hour_sentiments[hour] += sentiment
+        if HOURS == "numpy":
+            final_hour_sentiments.merge(hour_data)
+        else:
+            for hour, sentiment in hour_data.items():
+                if hour not in final_hour_sentiments:
+                    final_hour_sentiments[hour] = 0.0
+                final_hour_sentiments[hour] += sentiment
+        stats.add("merge", MPI.Wtime() - merge_start, lines=len(user_data) + len(hour_data))
 
     # happiest/saddest people -- sort by score（the second term）
     sorted_users = sorted(final_user_sentiments.items(), key=lambda x: x[1], reverse=True)
     # print(sorted_users)
     happiest_users = sorted_users[:5]
     saddest_users = sorted_users[-5:]
+    return happiest_users, saddest_users, final_hour_sentiments
 
-    # happiest/saddest hours -- sort by score（the second term）
-    sorted_hours = sorted(final_hour_sentiments.items(), key=lambda x: x[1], reverse=True)
-    # print(sorted_hours)
-    happiest_hours = sorted_hours[:5]
-    saddest_hours = sorted_hours[-5:]
 
+def receive_result_arrays():
+    """ rank 0 receives the sorted key / value arrays of every worker and merges them vectorised """
+    user_parts = []
+    hour_parts = []
+    for serial_num in range(1, size):
+        with stats.stage("communicate"):
+            user_arrays, hour_arrays = comm.recv(source=serial_num, tag=2)
+        user_parts.append(user_arrays)
+        hour_parts.append(hour_arrays)
+
+    with stats.stage("merge"):
+        keys, totals = merge_arrays(user_parts)
+        top, bottom = top_bottom_arrays(totals, 5)
+        # same order as the dict version: saddest users by descending score
+        happiest_users = [(decode_key(keys[i]), float(totals[i])) for i in top]
+        saddest_users = [(decode_key(keys[i]), float(totals[i])) for i in bottom[::-1]]
+        if HOURS == "numpy":
+            return happiest_users, saddest_users, merge_histograms(hour_parts)
+        hours, hour_totals = merge_arrays(hour_parts)
+    return happiest_users, saddest_users, dict(zip(hours.tolist(), hour_totals.tolist()))
+
+
+def write_results(happiest_users, saddest_users, happiest_hours, saddest_hours, hour_stats=None):
+    """ rank 0 writes the top 5 lists to a timestamped result file, hour_stats: {hour: (count, mean, variance)} """
     # 生成文件名: large-144G.ndjson_2025-03-31_17-30-00_results.txt
     output_filename = f"{os.path.basename(DATA_PATH)}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_results.txt"
 
@@ -188,11 +489,17 @@ def gather_results():
 
         f.write("\nTop 5 Happiest Hours:\n")
         for hour, score in happiest_hours:
-            f.write(f"{hour} - Sentiment Score: {score:.2f}\n")
+            f.write(f"{format_hour(hour)} - Sentiment Score: {score:.2f}\n")
 
         f.write("\nTop 5 Saddest Hours:\n")
         for hour, score in saddest_hours:
-            f.write(f"{hour} - Sentiment Score: {score:.2f}\n")
+            f.write(f"{format_hour(hour)} - Sentiment Score: {score:.2f}\n")
+
+        if hour_stats is not None:
+            f.write("\nHour Statistics (records, mean, population variance):\n")
+            for hour, _ in happiest_hours + saddest_hours:
+                count, mean, variance = hour_stats[hour]
+                f.write(f"{format_hour(hour)} - Records: {count}, Mean: {mean:.4f}, Variance: {variance:.4f}\n")
 
 
     print(f"Results saved to {output_filename}")
@@ -207,11 +514,11 @@ def gather_results():
     #
     # print("\nTop 5 Happiest Hours:")
     # for hour, score in happiest_hours:
-    #     print(f"{hour} - Sentiment Score: {score:.2f}")
+    #     print(f"{format_hour(hour)} - Sentiment Score: {score:.2f}")
     #
     # print("\nTop 5 Saddest Hours:")
     # for hour, score in saddest_hours:
-    #     print(f"{hour} - Sentiment Score: {score:.2f}")
+    #     print(f"{format_hour(hour)} - Sentiment Score: {score:.2f}")
 
 
 # # version 1 -- run test
@@ -251,11 +558,8 @@ if size == 1:
 
     for line in data_chunk:
         try:
-            data = json.loads(line).get("doc", {})
-            sentiment = data.get("sentiment", 0.00)
-            user_id = data.get("account", {}).get("id", "")
-            username = data.get("account", {}).get("username", "")
-            created_at = data.get("createdAt", None)
+            # PARSER: "json" -> full decode, "fast" -> projection of the four fields
+            created_at, sentiment, user_id, username = parse_line(line)
 
             if not user_id or not username or sentiment is None:
                 continue
@@ -263,11 +567,9 @@ if size == 1:
             user_key = (user_id, username)
             user_sentiments[user_key] = user_sentiments.get(user_key, 0.0) + sentiment
 
-            if created_at:
-                hour_key = created_at[:13]  # eg: "2023-11-23T15"
+            hour_key = epoch_hour(created_at) if created_at else None  # eg: 482699 -> "2025-01-24 11:00"
+            if hour_key is not None:
                 hour_sentiments[hour_key] = hour_sentiments.get(hour_key, 0.0) + sentiment
-        except json.JSONDecodeError:
-            continue
         except Exception as e:
             print(f"Error processing line: {e}")
             continue
@@ -301,11 +603,11 @@ if size == 1:
 
         f.write("\nTop 5 Happiest Hours:\n")
         for hour, score in happiest_hours:
-            f.write(f"{hour} - Sentiment Score: {score:.2f}\n")
+            f.write(f"{format_hour(hour)} - Sentiment Score: {score:.2f}\n")
 
         f.write("\nTop 5 Saddest Hours:\n")
         for hour, score in saddest_hours:
-            f.write(f"{hour} - Sentiment Score: {score:.2f}\n")
+            f.write(f"{format_hour(hour)} - Sentiment Score: {score:.2f}\n")
 
     print(f"Results saved to {output_filename}")
 
@@ -321,19 +623,24 @@ else:
         print(f"Data reading and distribution time: {read_end - read_start:.2f} seconds")
 
     processing_start = MPI.Wtime()
+    worker_sums = (None, None)
     if rank != 0:
-        process_and_aggregate()
+        worker_sums = process_and_aggregate()
     processing_end = MPI.Wtime()
     if rank != 0:
         print(f"Rank {rank} processing time: {processing_end - processing_start:.2f} seconds")
 
     gather_start = MPI.Wtime()
+    shuffled = shuffle_results(*worker_sums) if REDUCE == "shuffle" else None
     if rank == 0:
-        gather_results()
+        gather_results(shuffled)
     gather_end = MPI.Wtime()
     if rank == 0:
         print(f"Results gathering time: {gather_end - gather_start:.2f} seconds")
 
+    if REPORT:
+        write_report(comm, stats, REPORT, root=0)
+
     comm.barrier()
     MPI.Finalize()
     end_time = MPI.Wtime()
@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
-import json
 import sys
 import io
 from mpi4py import MPI
+import os
+
+
+# shared modules (record_parser ...) live in the parent scripts_on_spartan directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_parser import get_parser
+from hour_bucket import epoch_hour, format_hour
 
 """
   @Author: Garvyn-Yuan
@@ -44,6 +50,10 @@ start_time = MPI.Wtime()
 CHUNK_SIZE = 4 * 1024 * 1024 * 1024  # 4G
 DATA_PATH = "large-144G.ndjson"
 
+PARSER = "json"  # "json" -> full json.loads, "fast" -> field projection parser
+DECODER = "json"  # full decode backend: "json", "orjson", "msgspec" or "auto"
+parse_line = get_parser(PARSER, DECODER)
+
 # output stream to utf-8
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
@@ -105,12 +115,8 @@ def process_and_aggregate():
 
         for line in data_chunk:
             try:
-                # set default value to fill the empty position
-                data = json.loads(line).get("doc", {})
-                sentiment = data.get("sentiment", 0.00)
-                user_id = data.get("account", {}).get("id", "")
-                username = data.get("account", {}).get("username", "")
-                created_at = data.get("createdAt", None)
+                # PARSER: "json" -> full decode, "fast" -> projection of the four fields
+                created_at, sentiment, user_id, username = parse_line(line)
 
                 if not user_id or not username or sentiment is None:
                     continue
@@ -122,14 +128,12 @@ def process_and_aggregate():
                 user_sentiments[user_key] += sentiment
 
                 # cumulate by hour sentiment
-                if created_at:
-                    hour_key = created_at[:13]  # eg: "2023-11-23T15"
+                hour_key = epoch_hour(created_at) if created_at else None  # eg: 482699 -> "2025-01-24 11:00"
+                if hour_key is not None:
                     if hour_key not in hour_sentiments:
                         hour_sentiments[hour_key] = 0.0
                     hour_sentiments[hour_key] += sentiment
 
-            except json.JSONDecodeError:
-                continue
             except Exception as e:
                 print(f"Error processing line: {e}")
                 continue
@@ -184,11 +188,11 @@ def gather_results():
 
     print("\nTop 5 Happiest Hours:")
     for hour, score in happiest_hours:
-        print(f"{hour} - Sentiment Score: {score:.2f}")
+        print(f"{format_hour(hour)} - Sentiment Score: {score:.2f}")
 
     print("\nTop 5 Saddest Hours:")
     for hour, score in saddest_hours:
-        print(f"{hour} - Sentiment Score: {score:.2f}")
+        print(f"{format_hour(hour)} - Sentiment Score: {score:.2f}")
 
 
 # # version 1 -- run test
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: mmap_reader.py
+  @Contact: 228077gy@gmail.com
+  @Description: memory-mapped, newline-aligned byte-range reader for ndjson files
+    1. each rank maps the file once and only touches the bytes of its own [start, end) range
+    2. line boundaries are found with bulk byte searches (mmap.find / bytes.split) instead of
+       readline() + tell() on a text-mode file, so nothing is utf-8 decoded before json parsing
+    3. a line belongs to the range that contains its first byte -> every line is read exactly once
+  @Date: File created in 10:20-2026/10/17
+  @Modified by:
+  @Version: V1.0
+"""
+import mmap
+import os
+from contextlib import contextmanager
+
+BLOCK_SIZE = 64 * 1024 * 1024  # 64MB of whole lines per block
+
+
+@contextmanager
+def open_mmap(filename):
+    """ map the whole file read-only (an empty file maps to b'') """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap can not map an empty file, bytes has the same find/slice api
+            yield b''
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            yield mm
+        finally:
+            mm.close()
+
+
+def line_start(mm, pos):
+    """ offset of the first line starting at or after pos """
+    if pos <= 0:
+        return 0
+    # look one byte back: if pos is already a line start, the newline sits at pos - 1
+    nl = mm.find(b'\n', pos - 1)
+    return len(mm) if nl == -1 else nl + 1
+
+
+def iter_blocks(mm, start, end, block_size=BLOCK_SIZE):
+    """ yield (block_start, block_end) spans of whole lines whose first byte lies in [start, end) """
+    limit = len(mm)
+    end = min(end, limit)
+    pos = line_start(mm, start)
+    while pos < end:
+        # extend the cut to the end of the line holding byte cut - 1
+        cut = min(pos + block_size, end)
+        nl = mm.find(b'\n', cut - 1)
+        stop = limit if nl == -1 else nl + 1
+        yield pos, stop
+        pos = stop
+
+
+def iter_lines(mm, start, end, block_size=BLOCK_SIZE):
+    """ yield raw lines (bytes, newline stripped, empty lines skipped) of the [start, end) range """
+    for block_start, block_end in iter_blocks(mm, start, end, block_size):
+        # one bulk copy per block, then the C level split cuts every line at once
+        for line in mm[block_start:block_end].split(b'\n'):
+            if line:
+                yield line
+
+
+def split_span(start, end, parts):
+    """ static byte split of [start, end) into parts [a, b) spans, the last one takes the remainder """
+    chunk_size = (end - start) // parts
+    return [(start + i * chunk_size, end if i == parts - 1 else start + (i + 1) * chunk_size)
+            for i in range(parts)]
+
+
+def split_ranges(file_size, parts):
+    """ static byte split [start, end) of the whole file for each part """
+    return split_span(0, file_size, parts)
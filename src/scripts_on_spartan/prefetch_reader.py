@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: prefetch_reader.py
+  @Contact: 228077gy@gmail.com
+  @Description: read-ahead reader: a background thread reads the range while the rank parses (--reader prefetch)
+    1. the thread pread()s large blocks aligned to ALIGN (1MB, a multiple of the Lustre stripe size) into a
+       bounded queue, the scan loop takes them out -> the disk works while Python parses
+    2. posix_fadvise(SEQUENTIAL) for the range and WILLNEED for the next block, so the kernel readahead
+       is already fetching block i + 1 while block i is being copied (skipped where fadvise is missing)
+    3. memory: the queued blocks, the one being read and, on the consumer side, the block just taken out,
+       the text block built from it (carry-over + one join, no extra copy) and the previous text block the
+       scan may still hold, plus one block of allocator slack, stay within --prefetch-mb: a read is at most
+       budget / (HELD_BLOCKS + 1) (down to ALIGN), the queue gets what is left
+    4. same ownership rule as mmap_reader: the lines whose first byte lies in [start, end); past end the
+       thread only reads small TAIL_SIZE blocks until the last line is complete
+    5. pread releases the GIL, so the thread overlaps with parsing inside one process
+  @Date: File created in 14:30-2026/10/25
+  @Modified by:
+  @Version: V1.0
+"""
+import os
+import queue
+import threading
+
+ALIGN = 1024 * 1024
+READ_SIZE = 16 * 1024 * 1024  # largest pread, a multiple of ALIGN
+HELD_BLOCKS = 5  # outside the queue: the block being read, the taken one, the yielded and the previous text
+# block, plus one block of slack: freed blocks are not always handed back to the OS right away
+TAIL_SIZE = 64 * 1024  # reads past the range end, only the last line is missing there
+PREFETCH_MB = 128
+_DONE = None  # end of the blocks
+FADVISE = hasattr(os, 'posix_fadvise')  # not on macOS
+
+
+class Prefetcher:
+    """ iterator over raw aligned blocks of a file from the ALIGN boundary before start, filled by a thread """
+
+    def __init__(self, filename, start, end, read_size=READ_SIZE, budget_mb=PREFETCH_MB):
+        budget = int(budget_mb * 2 ** 20)
+        # budget = queue + HELD_BLOCKS, at least one queued block: smaller budgets get smaller reads
+        self.read_size = max(ALIGN, min(read_size, budget // (HELD_BLOCKS + 1)) // ALIGN * ALIGN)
+        self.depth = max(1, budget // self.read_size - HELD_BLOCKS)
+        self.offset = max(start - 1, 0) // ALIGN * ALIGN  # one byte back: is start a line start?
+        self.end = end
+        self.fd = os.open(filename, os.O_RDONLY)
+        self.blocks = queue.Queue(maxsize=self.depth)
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._produce, daemon=True)
+        self.thread.start()
+
+    def _produce(self):
+        try:
+            if FADVISE:
+                os.posix_fadvise(self.fd, self.offset, max(self.end - self.offset, 0), os.POSIX_FADV_SEQUENTIAL)
+            offset = self.offset
+            while not self.stop.is_set():
+                size = self.read_size if offset < self.end else TAIL_SIZE
+                if FADVISE and offset + size < self.end:
+                    # 提前告诉内核下一块，读这一块的同时磁盘已经在取下一块
+                    os.posix_fadvise(self.fd, offset + size, min(size, self.end - offset - size),
+                                     os.POSIX_FADV_WILLNEED)
+                block = os.pread(self.fd, size, offset)
+                if not block:
+                    break
+                self._put(block)
+                # 最后一行读完整了就停，不多读
+                if offset + len(block) >= self.end and block.find(b'\n', max(self.end - 1 - offset, 0)) != -1:
+                    break
+                offset += len(block)
+        except OSError as e:
+            self._put(e)
+        self._put(_DONE)
+
+    def _put(self, item):
+        """ blocking put that gives up once the consumer closed the prefetcher """
+        while not self.stop.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        while True:
+            block = self.blocks.get()
+            if block is _DONE:
+                return
+            if isinstance(block, OSError):
+                raise block
+            yield block
+            del block  # not held while waiting for the next one
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+        os.close(self.fd)
+
+
+def prefetch_blocks(filename, start, end, read_size=READ_SIZE, budget_mb=PREFETCH_MB):
+    """ yield text blocks of the whole lines whose first byte lies in [start, end), read ahead by a thread """
+    if start >= end:
+        return
+    prefetcher = Prefetcher(filename, start, end, read_size, budget_mb)
+    try:
+        offset = prefetcher.offset  # file offset of the next block
+        carry = b''  # the bytes from pos up to the next block, part of one line
+        pos = 0 if start <= 0 else None  # next line start to hand out, None until the first one is found
+        for block in prefetcher:
+            begin, skip = offset, 0  # file offset of the block, its bytes before pos
+            offset += len(block)
+            if pos is None:
+                nl = block.find(b'\n', max(start - 1 - begin, 0))
+                if nl == -1:
+                    continue
+                pos, skip = begin + nl + 1, nl + 1
+            if pos >= end:
+                return
+            # one join per yielded block: no "carry + block" copy next to the slice of it
+            # the line holding byte end - 1 is the last one of the range
+            last = block.find(b'\n', max(end - 1 - begin, skip))
+            if last != -1:
+                yield b''.join((carry, memoryview(block)[skip:last + 1]))
+                return
+            last = block.rfind(b'\n', skip)
+            if last == -1:
+                # 整块都在同一行里，接到 carry 上
+                carry = b''.join((carry, memoryview(block)[skip:]))
+                continue
+            yield b''.join((carry, memoryview(block)[skip:last + 1]))
+            # 剩下的半行留到下一块
+            pos, carry = begin + last + 1, block[last + 1:]
+        if pos is not None and pos < end and carry:
+            # 文件末尾没有换行的最后一行
+            yield carry
+    finally:
+        prefetcher.close()
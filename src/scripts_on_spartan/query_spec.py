@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: query_spec.py
+  @Contact: 228077gy@gmail.com
+  @Description: declarative group-by queries compiled into one specialised scan loop (--spec)
+    1. a spec is a list of queries (json / yaml file, or inline json on the command line):
+         {"name": "instance_mood",
+          "by": ["doc.account:instance"],           # json path[:transform] or {"path", "transform", "name"},
+                                                     # [] expands a list
+          "value": "doc.sentiment",                  # numeric path, omitted -> count only
+          "aggregates": ["sum", "count", "mean"],    # sum | count | mean | min | max
+          "require": ["doc.account.id"],             # extra paths that must be present
+          "order_by": "sum", "top": 5, "bottom": 5}
+       transforms: raw, lower, hour, day, dow, domain (of "user@host" or an url), instance (of an account)
+    2. compile_spec() writes the python source of one scan(lines, ...) function: every json path is walked
+       once per line however many queries use it, every (path, transform) key is computed once, each
+       query updates only the fields its aggregates need -> no per-line interpretation of the spec
+    3. a table is {key: [count, sum, min, max]} restricted to the fields needed, merged field by field
+    4. python query_spec.py SPEC prints the generated source
+  @Date: File created in 15:40-2026/10/24
+  @Modified by:
+  @Version: V1.0
+"""
+import argparse
+import json
+import operator
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from hour_bucket import epoch_hour, format_hour
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+AGGREGATES = ('sum', 'count', 'mean', 'min', 'max')
+FIELDS = ('count', 'sum', 'min', 'max')  # stored per key, mean = sum / count
+FIELD_MERGE = {'count': operator.add, 'sum': operator.add, 'min': min, 'max': max}
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+TOP_K = 5
+
+_EPOCH = datetime(1970, 1, 1)
+
+# labels(key) -> the printed / csv column of one key part
+SpecQuery = namedtuple('SpecQuery', ['name', 'columns', 'labels', 'fields', 'aggregates', 'order_by', 'top',
+                                     'bottom', 'label'])
+CompiledSpec = namedtuple('CompiledSpec', ['queries', 'scan', 'source'])
+
+
+def _raw(value):
+    return value if type(value) in (str, int, float, bool) else None
+
+
+def _lower(value):
+    return value.lower() if type(value) is str else None
+
+
+def _hour(value):
+    return epoch_hour(value) if type(value) is str else None
+
+
+def _day(value):
+    hour = _hour(value)
+    return None if hour is None else hour // 24
+
+
+def _dow(value):
+    # 1970-01-01 was a thursday
+    day = _day(value)
+    return None if day is None else (day + 3) % 7
+
+
+def _domain(value):
+    """ host of "user@host" or of an url """
+    if type(value) is not str or not value:
+        return None
+    if '://' in value:
+        parts = value.split('/')
+        return parts[2].lower() if len(parts) > 2 and parts[2] else None
+    return value.rsplit('@', 1)[1].lower() if '@' in value else None
+
+
+def _instance(account):
+    """ home instance of an account: domain of acct, host of the account url for local accounts """
+    if type(account) is not dict:
+        return None
+    return _domain(account.get('acct')) or _domain(account.get('url'))
+
+
+# transform -> (function of the raw value, label of the transformed key)
+TRANSFORMS = {
+    'raw': (_raw, str),
+    'lower': (_lower, str),
+    'hour': (_hour, format_hour),
+    'day': (_day, lambda day: (_EPOCH + timedelta(days=day)).strftime('%Y-%m-%d')),
+    'dow': (_dow, WEEKDAYS.__getitem__),
+    'domain': (_domain, str),
+    'instance': (_instance, str),
+}
+
+
+def _each(items, inner, transform):
+    """ distinct transformed values of inner path of every element of a list """
+    if type(items) is not list:
+        return ()
+    values = []
+    for item in items:
+        for segment in inner:
+            item = item.get(segment) if type(item) is dict else None
+        value = transform(item)
+        if value is not None:
+            values.append(value)
+    return dict.fromkeys(values)
+
+
+def parse_term(term):
+    """ "doc.tags[].name:lower" -> (('doc', 'tags'), ('name',), 'lower'), inner is None without [] """
+    if isinstance(term, dict):
+        path, transform = term.get('path'), term.get('transform', 'raw')
+    else:
+        path, _, transform = str(term).partition(':')
+        transform = transform or 'raw'
+    if not path:
+        raise ValueError(f"empty path in {term!r}")
+    if transform not in TRANSFORMS:
+        raise ValueError(f"unknown transform {transform!r} in {term!r}, choose from {tuple(TRANSFORMS)}")
+    if path.count('[]') > 1:
+        raise ValueError(f"only one [] per path: {path!r}")
+    outer, _, inner = path.partition('[]')
+    outer = tuple(s for s in outer.split('.') if s)
+    inner = tuple(s for s in inner.split('.') if s) if '[]' in path else None
+    return outer, inner, transform
+
+
+def normalise(spec):
+    """ list of checked query dicts of a spec ({"queries": [...]}, a list or one query) """
+    if isinstance(spec, dict):
+        spec = spec.get('queries', [spec])
+    if not isinstance(spec, list) or not spec:
+        raise ValueError("a spec is a non-empty list of queries")
+    queries, names = [], set()
+    for query in spec:
+        if not isinstance(query, dict) or not query.get('name'):
+            raise ValueError(f"every query needs a name: {query!r}")
+        name = str(query['name'])
+        if name in names:
+            raise ValueError(f"duplicate query name {name!r}")
+        names.add(name)
+        by = query.get('by', [])
+        by = [by] if isinstance(by, (str, dict)) else list(by)
+        value = query.get('value')
+        aggregates = list(query.get('aggregates', ['sum', 'count', 'mean'] if value else ['count']))
+        unknown = [a for a in aggregates if a not in AGGREGATES]
+        if unknown or not aggregates:
+            raise ValueError(f"{name}: unknown aggregates {unknown}, choose from {AGGREGATES}")
+        if value is None and set(aggregates) - {'count'}:
+            raise ValueError(f"{name}: {aggregates} need a value path")
+        order_by = query.get('order_by', aggregates[0])
+        if order_by not in aggregates:
+            raise ValueError(f"{name}: order_by {order_by!r} is not one of its aggregates")
+        if sum(parse_term(term)[1] is not None for term in by) > 1:
+            raise ValueError(f"{name}: only one group-by key may expand a list ([])")
+        for term in list(by) + list(query.get('require', [])) + ([value] if value else []):
+            parse_term(term)
+        if value and (parse_term(value)[1] is not None or parse_term(value)[2] != 'raw'):
+            raise ValueError(f"{name}: the value must be a plain path")
+        queries.append({'name': name, 'by': by, 'value': value, 'aggregates': aggregates,
+                        'require': list(query.get('require', [])), 'order_by': order_by,
+                        'top': int(query.get('top', TOP_K)), 'bottom': int(query.get('bottom', TOP_K)),
+                        'label': query.get('label', order_by)})
+    return queries
+
+
+def load_spec(text):
+    """ spec from a .json / .yaml / .yml file or an inline json string """
+    if os.path.isfile(text):
+        with open(text, encoding='utf-8') as f:
+            if text.endswith(('.yaml', '.yml')):
+                if yaml is None:
+                    raise ValueError("yaml specs need PyYAML (pip install pyyaml), or write the spec as json")
+                return normalise(yaml.safe_load(f))
+            return normalise(json.load(f))
+    try:
+        return normalise(json.loads(text))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{text!r} is neither a spec file nor inline json ({e})")
+
+
+class _Writer:
+    """ python source of the scan loop, one name per path node / key / value """
+
+    def __init__(self):
+        self.lines = []
+        self.nodes = {(): 'data'}
+        self.terms = {}
+
+    def emit(self, line, depth=2):
+        self.lines.append('    ' * depth + line)
+
+    def node(self, path):
+        if path not in self.nodes:
+            parent = self.node(path[:-1])
+            var = f'n{len(self.nodes)}'
+            self.emit(f"{var} = {parent}.get({path[-1]!r}) if type({parent}) is dict else None")
+            self.nodes[path] = var
+        return self.nodes[path]
+
+    def term(self, term):
+        """ variable holding the transformed value (or the distinct values when the path has []) """
+        outer, inner, transform = parse_term(term)
+        key = (outer, inner, transform)
+        if key not in self.terms:
+            var = f'k{len(self.terms)}'
+            node = self.node(outer)
+            if inner is None:
+                self.emit(f"{var} = _t_{transform}({node})")
+            else:
+                self.emit(f"{var} = _each({node}, {inner!r}, _t_{transform})")
+            self.terms[key] = var
+        return self.terms[key], inner is not None
+
+
+def compile_queries(queries):
+    """ CompiledSpec of a normalised spec """
+    writer = _Writer()
+    compiled, blocks = [], []
+    for i, query in enumerate(queries):
+        fields = [f for f in FIELDS if f in query['aggregates'] or
+                  (f in ('count', 'sum') and 'mean' in query['aggregates'])]
+        keys = [writer.term(term) for term in query['by']]
+        value = None
+        if query['value']:
+            node = writer.node(parse_term(query['value'])[0])
+            value = f'v{i}'
+            writer.emit(f"{value} = {node} if type({node}) in _NUMBERS else None")
+        checks = [f"{var} is not None" for var, multi in keys if not multi] + \
+                 ([f"{value} is not None"] if value else [])
+        for term in query['require']:
+            var, multi = writer.term(term)
+            checks.append(f"{var}" if multi else f"{var} is not None and {var} != ''")
+
+        # update of table t<i>
+        block, depth = [], 2
+        if checks:
+            block.append((depth, f"if {' and '.join(checks)}:"))
+            depth += 1
+        for var, multi in keys:
+            if multi:
+                block.append((depth, f"for {var}_ in {var}:"))
+                depth += 1
+        parts = [f"{var}_" if multi else var for var, multi in keys]
+        key = parts[0] if len(parts) == 1 else f"({', '.join(parts)},)" if parts else "'all'"
+        initial = {'count': '1', 'sum': value, 'min': value, 'max': value}
+        block.append((depth, f"e = t{i}.get({key})"))
+        block.append((depth, "if e is None:"))
+        block.append((depth + 1, f"t{i}[{key}] = [{', '.join(initial[f] for f in fields)}]"))
+        block.append((depth, "else:"))
+        for position, field in enumerate(fields):
+            if field == 'count':
+                block.append((depth + 1, f"e[{position}] += 1"))
+            elif field == 'sum':
+                block.append((depth + 1, f"e[{position}] += {value}"))
+            elif field == 'min':
+                block.append((depth + 1, f"if {value} < e[{position}]: e[{position}] = {value}"))
+            else:
+                block.append((depth + 1, f"if {value} > e[{position}]: e[{position}] = {value}"))
+        blocks.append(block)
+
+        transforms = [parse_term(term)[2] for term in query['by']]
+        columns = tuple(term.get('name') or term['path'] if isinstance(term, dict) else str(term)
+                        for term in query['by']) or ('total',)
+        compiled.append(SpecQuery(query['name'], columns, tuple(TRANSFORMS[t][1] for t in transforms), tuple(fields),
+                                  tuple(query['aggregates']), query['order_by'], query['top'], query['bottom'],
+                                  query['label']))
+
+    tables = ', '.join(f't{i}' for i in range(len(queries)))
+    source = [f"def scan(lines, loads, errors, {tables}):",
+              "    for line in lines:",
+              "        try:",
+              "            data = loads(line)",
+              "        except errors:",
+              "            continue"]
+    source += writer.lines
+    for block in blocks:
+        source += ['    ' * depth + line for depth, line in block]
+    source = '\n'.join(source) + '\n'
+
+    namespace = {'_each': _each, '_NUMBERS': (int, float)}
+    namespace.update({f'_t_{name}': function for name, (function, _) in TRANSFORMS.items()})
+    exec(compile(source, '<query spec>', 'exec'), namespace)
+    return CompiledSpec(compiled, namespace['scan'], source)
+
+
+@lru_cache(maxsize=8)
+def _compile_cached(key):
+    return compile_queries(json.loads(key))
+
+
+def compile_spec(queries):
+    """ compile_queries() cached by the spec's json, pool workers compile each spec once """
+    return _compile_cached(json.dumps(queries, sort_keys=True))
+
+
+def label_of(query, key):
+    """ printed / csv columns of a key of query """
+    if not query.labels:
+        return (key,)
+    parts = key if len(query.labels) > 1 else (key,)
+    return tuple(label(part) for label, part in zip(query.labels, parts))
+
+
+def aggregate_of(query, entry, aggregate):
+    fields = dict(zip(query.fields, entry))
+    return fields['sum'] / fields['count'] if aggregate == 'mean' else fields[aggregate]
+
+
+def merge_tables(query, target, table):
+    """ add table into target field by field """
+    merges = [FIELD_MERGE[f] for f in query.fields]
+    for key, entry in table.items():
+        current = target.get(key)
+        if current is None:
+            target[key] = list(entry)
+        else:
+            for position, merge in enumerate(merges):
+                current[position] = merge(current[position], entry[position])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='check a query spec and print the generated scan function')
+    parser.add_argument('spec', help='.json / .yaml file or inline json')
+    args = parser.parse_args()
+    try:
+        print(compile_spec(load_spec(args.spec)).source)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: record_parser.py
+  @Contact: 228077gy@gmail.com
+  @Description: record parsers returning (created_at, sentiment, user_id, username) for one ndjson line
+    1. "json" -- full json.loads of the line (original behaviour)
+    2. "fast" -- field projection on the raw bytes, only the four values we aggregate are cut out,
+       the big blobs (content, account.note, emojis, fields ...) are never decoded
+    3. the fast parser only trusts a key found at the right nesting level (braces inside string values
+       are not counted), any line it can not handle (missing key, escaped string, broken framing) falls
+       back to the json parser
+    4. the full decode goes through a pluggable backend from decoders.py (--decoder json/orjson/msgspec)
+  @Date: File created in 14:05-2026/10/17
+  @Modified by:
+  @Version: V1.0
+"""
+from functools import partial
+
+from decoders import DECODE_ERRORS, get_decoder
+
+# byte patterns of the projected paths: doc.createdAt, doc.sentiment, doc.account.id, doc.account.username
+_DOC = b'"doc":{'
+_ACCOUNT = b'"account":{'
+_CREATED_AT = b'"createdAt":"'
+_SENTIMENT = b'"sentiment":'
+_ID = b'"id":"'
+_USERNAME = b'"username":"'
+
+
+def parse_line(line, decode=get_decoder('json')):
+    """ full json decode (str or bytes line) """
+    try:
+        return decode(line)
+    except DECODE_ERRORS:
+        return None, None, None, None
+
+
+def _find_key(line, key, begin):
+    """ first occurrence of key after begin that sits at the same nesting level as begin, -1 if none
+        (or if an escaped backslash makes the strings before it ambiguous, the caller falls back) """
+    pos = line.find(key, begin)
+    depth, quotes, last = 0, 0, begin
+    opening, closing = line.find(b'{', begin), line.find(b'}', begin)
+    while pos != -1:
+        # keys only live in objects: balanced braces between begin and pos -> same level
+        while -1 < opening < pos or -1 < closing < pos:
+            at = opening if -1 < opening < pos and (closing == -1 or opening < closing) else closing
+            if line.find(b'\\\\', last, at) != -1:
+                return -1
+            quotes += line.count(b'"', last, at) - line.count(b'\\"', last, at)
+            last = at
+            # a brace after an odd number of unescaped quotes sits inside a string value (account.note ...)
+            if at == opening:
+                depth += quotes % 2 == 0
+                opening = line.find(b'{', at + 1)
+            else:
+                depth -= quotes % 2 == 0
+                closing = line.find(b'}', at + 1)
+        if depth == 0:
+            return pos
+        pos = line.find(key, pos + 1)
+    return -1
+
+
+def _string_value(line, key, begin):
+    """ plain (escape free) string value of key, None if it can not be cut out safely """
+    pos = _find_key(line, key, begin)
+    if pos == -1:
+        return None
+    value_start = pos + len(key)
+    value_end = line.find(b'"', value_start)
+    if value_end == -1:
+        return None
+    value = line[value_start:value_end]
+    if b'\\' in value:
+        return None
+    return value.decode('utf-8')
+
+
+def parse_line_fast(line, fallback=parse_line):
+    """ projection parse of the four fields, falls back to the full decode for odd lines """
+    raw = line.encode('utf-8') if isinstance(line, str) else line
+    try:
+        raw = raw.strip()
+        # validate the framing first: truncated / broken lines go to the full decoder
+        if not raw.startswith(b'{') or not raw.endswith(b'}'):
+            return fallback(raw)
+        doc_start = raw.find(_DOC)
+        if doc_start == -1:
+            return fallback(raw)
+        doc_start += len(_DOC)
+
+        created_at = _string_value(raw, _CREATED_AT, doc_start)
+
+        sentiment_pos = _find_key(raw, _SENTIMENT, doc_start)
+        if sentiment_pos == -1:
+            return fallback(raw)
+        value_start = sentiment_pos + len(_SENTIMENT)
+        value_end = min(p for p in (raw.find(b',', value_start), raw.find(b'}', value_start), len(raw))
+                        if p != -1)
+        value = raw[value_start:value_end].strip()
+        sentiment = None if value == b'null' else float(value)
+
+        account_start = _find_key(raw, _ACCOUNT, doc_start)
+        if account_start == -1:
+            return fallback(raw)
+        account_start += len(_ACCOUNT)
+        user_id = _string_value(raw, _ID, account_start)
+        username = _string_value(raw, _USERNAME, account_start)
+
+        if created_at is None or user_id is None or username is None:
+            return fallback(raw)
+        return created_at, sentiment, user_id, username
+    except (ValueError, UnicodeDecodeError):
+        return fallback(raw)
+
+
+PARSERS = ('json', 'fast')
+
+
+def get_parser(parser='json', decoder='json'):
+    """ line parser for --parser / --decoder """
+    parse_full = partial(parse_line, decode=get_decoder(decoder))
+    if parser == 'json':
+        return parse_full
+    if parser == 'fast':
+        return partial(parse_line_fast, fallback=parse_full)
+    raise ValueError(f"unknown parser {parser!r}, choose from {PARSERS}")
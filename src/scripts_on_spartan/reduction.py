@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: reduction.py
+  @Contact: 228077gy@gmail.com
+  @Description: reduction of the per-rank user sentiment sums to the top / bottom k users
+    1. gather  -- every rank ships its whole user dict to root, root merges all of them (original design)
+    2. shuffle -- users are hash-partitioned over the ranks with one alltoall, every rank merges the shard
+                  it owns and keeps only its local top / bottom k, root merges size * k candidates
+    3. the shard of a user comes from crc32 (python's str hash is salted per process)
+    4. --exchange binary: no pickled dicts in the final exchange
+         hours -- a dense float64 array over the global epoch-hour range, summed with comm.Reduce(MPI.SUM)
+                  (plus an int32 "seen" array so an hour with sum 0.0 is not lost), sorted key / value
+                  arrays instead when the range is absurdly wide (broken createdAt years); --hours numpy
+                  reduces the count and sum-of-squares arrays of the HourHistogram the same way
+         users -- sorted (utf-8 key array, float64 value array) pairs, root merges them with one
+                  np.unique + np.bincount instead of a python loop over every key
+  @Date: File created in 16:20-2026/10/18
+  @Modified by:
+  @Version: V1.0
+"""
+import heapq
+import zlib
+from collections import defaultdict
+from operator import itemgetter
+
+import numpy as np
+from mpi4py import MPI
+
+from hour_histogram import HourHistogram, merge_histograms
+from user_accumulator import top_bottom_arrays
+
+REDUCERS = ('gather', 'shuffle')
+EXCHANGES = ('pickle', 'binary')
+TOP_K = 5
+MAX_DENSE_HOURS = 1 << 20  # ~120 years of hours, 8MB per rank
+
+
+def top_bottom(items, k=TOP_K):
+    """ (k largest, k smallest) (key, score) pairs, same order as sorted(...)[:k] """
+    items = list(items)
+    return heapq.nlargest(k, items, key=itemgetter(1)), heapq.nsmallest(k, items, key=itemgetter(1))
+
+
+def merge_parts(parts):
+    """ sum a list of {key: score} dicts, in list order """
+    total = defaultdict(float)
+    for part in parts:
+        for key, value in part.items():
+            total[key] += value
+    return total
+
+
+def user_shard(user, size):
+    """ owner rank of a user key (username or (user_id, username)), identical on every rank """
+    raw = user if isinstance(user, str) else '\0'.join(map(str, user))
+    return zlib.crc32(raw.encode('utf-8')) % size
+
+
+def encode_key(user):
+    """ utf-8 bytes of a user key, tuple keys joined with '\0' like user_shard() """
+    return (user if isinstance(user, str) else '\0'.join(map(str, user))).encode('utf-8')
+
+
+def decode_key(raw):
+    key = raw.decode('utf-8')
+    return tuple(key.split('\0')) if '\0' in key else key
+
+
+def key_arrays(sums):
+    """ (sorted keys, float64 values) of a {key: score} dict, int keys stay int64, others become utf-8 'S' """
+    if sums and all(isinstance(key, int) for key in sums):
+        keys = np.fromiter(sums.keys(), np.int64, len(sums))
+    else:
+        keys = np.array([encode_key(key) for key in sums], dtype=bytes)
+    values = np.fromiter(sums.values(), np.float64, len(sums))
+    order = np.argsort(keys, kind='stable')
+    return keys[order], values[order]
+
+
+def merge_arrays(parts):
+    """ (unique sorted keys, summed values) of [(keys, values)], each key summed in part order """
+    parts = [part for part in parts if len(part[0])]
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0, np.float64)
+    keys, inverse = np.unique(np.concatenate([part[0] for part in parts]), return_inverse=True)
+    return keys, np.bincount(inverse, weights=np.concatenate([part[1] for part in parts]), minlength=len(keys))
+
+
+def reduce_hours(comm, hour_sentiment, root=0):
+    """ {epoch hour: sum} on root after a dense Reduce(SUM), None on other ranks (collective) """
+    hours, sums = key_arrays(hour_sentiment) if hour_sentiment else (np.empty(0, np.int64), np.empty(0))
+    low = comm.allreduce(int(hours[0]) if len(hours) else np.iinfo(np.int64).max, op=MPI.MIN)
+    high = comm.allreduce(int(hours[-1]) if len(hours) else np.iinfo(np.int64).min, op=MPI.MAX)
+    if high < low:
+        return {} if comm.Get_rank() == root else None
+
+    if high - low + 1 > MAX_DENSE_HOURS:
+        parts = comm.gather((hours, sums), root=root)
+        if comm.Get_rank() != root:
+            return None
+        hours, sums = merge_arrays(parts)
+        return dict(zip(hours.tolist(), sums.tolist()))
+
+    dense = np.zeros(high - low + 1, np.float64)
+    seen = np.zeros(high - low + 1, np.int32)
+    dense[hours - low] = sums
+    seen[hours - low] = 1
+    is_root = comm.Get_rank() == root
+    total = np.zeros_like(dense) if is_root else None
+    total_seen = np.zeros_like(seen) if is_root else None
+    comm.Reduce(dense, total, op=MPI.SUM, root=root)
+    comm.Reduce(seen, total_seen, op=MPI.SUM, root=root)
+    if not is_root:
+        return None
+    present = np.flatnonzero(total_seen)
+    return dict(zip((present + low).tolist(), total[present].tolist()))
+
+
+def reduce_hour_histogram(comm, histogram, root=0):
+    """ HourHistogram of all ranks on root, None on other ranks (collective): sums, counts and squares are
+        dense arrays over the global hour range summed with Reduce(SUM), whole histograms are gathered and
+        merged when the range is too wide """
+    hours, sums, counts, squares = histogram.arrays()
+    low = comm.allreduce(int(hours[0]) if len(hours) else np.iinfo(np.int64).max, op=MPI.MIN)
+    high = comm.allreduce(int(hours[-1]) if len(hours) else np.iinfo(np.int64).min, op=MPI.MAX)
+    is_root = comm.Get_rank() == root
+    if high < low:
+        return HourHistogram() if is_root else None
+
+    if high - low + 1 > MAX_DENSE_HOURS:
+        parts = comm.gather(histogram, root=root)
+        return merge_histograms(parts) if is_root else None
+
+    # a count > 0 marks an hour with records, no extra "seen" array
+    arrays = [np.zeros(high - low + 1, dtype) for dtype in (np.float64, np.int64, np.float64)]
+    for dense, values in zip(arrays, (sums, counts, squares)):
+        dense[hours - low] = values
+    totals = [np.zeros_like(dense) if is_root else None for dense in arrays]
+    for dense, total in zip(arrays, totals):
+        comm.Reduce(dense, total, op=MPI.SUM, root=root)
+    if not is_root:
+        return None
+    present = np.flatnonzero(totals[1])
+    result = HourHistogram()
+    result.add_batch(present + low, totals[0][present], totals[1][present], totals[2][present])
+    return result
+
+
+def gather_user_arrays(comm, user_sentiment, k=TOP_K, root=0):
+    """ (happiest, saddest) users on root after a gather of sorted key / value arrays, None elsewhere """
+    parts = comm.gather(key_arrays(user_sentiment), root=root)
+    if comm.Get_rank() != root:
+        return None
+    keys, totals = merge_arrays(parts)
+    top, bottom = top_bottom_arrays(totals, k)
+    return tuple([(decode_key(keys[i]), float(totals[i])) for i in part] for part in (top, bottom))
+
+
+def gather_users(comm, user_sentiment, k=TOP_K, root=0):
+    """ (happiest, saddest) users on root after a plain gather, None on other ranks """
+    all_user_sentiment = comm.gather(user_sentiment, root=root)
+    if comm.Get_rank() != root:
+        return None
+    return top_bottom(merge_parts(all_user_sentiment).items(), k)
+
+
+def shuffle_users(comm, user_sentiment, k=TOP_K, root=0):
+    """ (happiest, saddest) users on root after a hash-partitioned alltoall, None on other ranks """
+    size = comm.Get_size()
+    outgoing = [{} for _ in range(size)]
+    for user, sentiment in user_sentiment.items():
+        outgoing[user_shard(user, size)][user] = sentiment
+
+    # incoming[i] = the part of rank i's dict owned by this rank, merged in rank order like gather
+    incoming = comm.alltoall(outgoing)
+    happiest, saddest = top_bottom(merge_parts(incoming).items(), k)
+
+    candidates = comm.gather((happiest, saddest), root=root)
+    if comm.Get_rank() != root:
+        return None
+    # every global top / bottom k user is in the top / bottom k of the shard that owns it
+    return (heapq.nlargest(k, (c for top, _ in candidates for c in top), key=itemgetter(1)),
+            heapq.nsmallest(k, (c for _, bottom in candidates for c in bottom), key=itemgetter(1)))
+
+
+def reduce_users(comm, user_sentiment, reducer='gather', k=TOP_K, root=0, exchange='pickle'):
+    """ top / bottom k users for --reduce / --exchange """
+    if reducer == 'gather':
+        if exchange == 'binary':
+            return gather_user_arrays(comm, user_sentiment, k, root)
+        return gather_users(comm, user_sentiment, k, root)
+    if reducer == 'shuffle':
+        return shuffle_users(comm, user_sentiment, k, root)
+    raise ValueError(f"unknown reducer {reducer!r}, choose from {REDUCERS}")
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: scheduler.py
+  @Contact: 228077gy@gmail.com
+  @Description: byte-range schedulers deciding which parts of the file a rank scans
+    1. static  -- one file_size // size slice per rank (original design, the slowest rank sets the wall time)
+    2. dynamic -- the file is cut into many smaller pieces, a shared counter in an MPI window on rank 0
+                  hands them out on demand (MPI.Win Fetch_and_op), ranks that finish early pull more work
+    3. pieces are plain byte spans, the reader gives each line to the piece holding its first byte,
+       so pieces never need to be line-aligned up front
+    4. with a line index (line_index.py) slices and pieces are cut at record starts and hold about
+       the same number of records instead of the same number of bytes
+  @Date: File created in 14:40-2026/10/18
+  @Modified by:
+  @Version: V1.0
+"""
+from array import array
+
+from mpi4py import MPI
+
+from line_index import record_ranges
+from mmap_reader import split_ranges
+
+SCHEDULERS = ('static', 'dynamic')
+PIECES_PER_RANK = 16
+
+
+def split_pieces(file_size, parts, index=None):
+    """ byte split of the whole file, record-balanced when a line index is given """
+    return record_ranges(index, parts) if index is not None else split_ranges(file_size, parts)
+
+
+def static_ranges(comm, file_size, index=None):
+    """ the single [start, end) slice of this rank """
+    return [split_pieces(file_size, comm.Get_size(), index)[comm.Get_rank()]]
+
+
+def dynamic_ranges(comm, file_size, num_pieces, index=None):
+    """ yield pieces [start, end) taken from a shared counter until the file is exhausted (collective) """
+    pieces = split_pieces(file_size, num_pieces, index)
+    # the counter lives on rank 0, other ranks expose no memory
+    itemsize = MPI.INT64_T.Get_size()
+    win = MPI.Win.Allocate(itemsize if comm.Get_rank() == 0 else 0, itemsize, comm=comm)
+    one = array('q', [1])
+    taken = array('q', [0])
+    if comm.Get_rank() == 0:
+        # MPI_Alloc_mem memory is not zeroed
+        win.Lock(0)
+        win.Put([taken, MPI.INT64_T], 0)
+        win.Unlock(0)
+    comm.Barrier()
+    try:
+        while True:
+            # Fetch_and_op is atomic, a shared lock lets ranks take pieces concurrently
+            win.Lock(0, MPI.LOCK_SHARED)
+            win.Fetch_and_op([one, MPI.INT64_T], [taken, MPI.INT64_T], 0, 0, MPI.SUM)
+            win.Unlock(0)
+            if taken[0] >= num_pieces:
+                break
+            yield pieces[taken[0]]
+    finally:
+        # collective: every rank frees the window once it ran out of pieces
+        win.Free()
+
+
+def get_ranges(comm, file_size, scheduler='static', pieces_per_rank=PIECES_PER_RANK, index=None):
+    """ byte ranges this rank has to scan for --scheduler """
+    if scheduler == 'static':
+        return static_ranges(comm, file_size, index)
+    if scheduler == 'dynamic':
+        return dynamic_ranges(comm, file_size, comm.Get_size() * pieces_per_rank, index)
+    raise ValueError(f"unknown scheduler {scheduler!r}, choose from {SCHEDULERS}")
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: spill_aggregator.py
+  @Contact: 228077gy@gmail.com
+  @Description: exact per-username sums under a memory budget (--users spill)
+    1. sums live in a plain dict until it holds about --spill-mb worth of entries, then the dict is
+       written to local scratch ($TMPDIR, --spill-dir) as one sorted run and cleared
+    2. a run is sorted by (crc32(username), username) and written as pickled blocks of BLOCK_ENTRIES,
+       only the first hash and byte offset of every block stay in memory -> any hash range of a run is
+       read back block by block without touching the rest
+    3. stream(low, high) is a heapq.merge over the runs (read lazily) and the dict, equal usernames summed
+       on the fly, so nothing but one block per run and the dict is in memory
+    4. reduce: the partition count comes from the entries of all ranks / the budget, so one hash range
+       of every rank together is about one budget; range p is gathered to rank p % size, which streams
+       a heapq.merge over the parts and keeps only its top / bottom k, root merges those candidates
+       -> exact result, at most budget + one partition in memory on any rank
+    5. run files are removed by close(), pool workers leave theirs for the rank that merges them
+    6. like user_accumulator, no mpi4py import: pool workers build aggregators too
+  @Date: File created in 14:00-2026/10/23
+  @Modified by:
+  @Version: V1.0
+"""
+import heapq
+import os
+import pickle
+import tempfile
+import zlib
+from bisect import bisect_left
+from collections import defaultdict
+from operator import itemgetter
+
+SPILL_MB = 512  # in-memory dict budget per aggregator
+ENTRY_BYTES = 160  # rough size of one dict entry: slot + username str + float
+BLOCK_ENTRIES = 4096  # (hash, username, sum) entries per pickled block of a run
+HASH_SPACE = 1 << 32  # crc32 values
+
+_order = itemgetter(0, 1)  # (hash, username): equal users are next to each other
+
+
+def hash_of(username):
+    return zlib.crc32(username.encode('utf-8'))
+
+
+class SpillAggregator:
+    """ {username: sum} that spills sorted runs to disk when it grows past a budget """
+
+    def __init__(self, budget_mb=SPILL_MB, spill_dir=None):
+        self.max_entries = max(1, int(budget_mb * 2 ** 20) // ENTRY_BYTES)
+        self.spill_dir = spill_dir or tempfile.gettempdir()  # gettempdir() honours $TMPDIR
+        self.table = defaultdict(float)
+        self.runs = []  # (path, first hash of every block, byte offsets of the blocks + end)
+        self.spilled = 0  # entries written to all runs
+
+    def add(self, user_id, username, sentiment):
+        """ add one record (same signature as UserAccumulator.add) """
+        self.table[username] += sentiment
+        if len(self.table) >= self.max_entries:
+            self.spill()
+
+    def add_batch(self, ids, sentiments, name_of):
+        """ add sentiments[i] to user name_of(i) (ids only kept for the UserAccumulator signature) """
+        for i, value in enumerate(sentiments.tolist()):
+            self.add(None, name_of(i), value)
+
+    def flush(self):
+        """ nothing is buffered outside the dict, kept for the accumulator interface """
+
+    def spill(self):
+        """ write the dict as one sorted run of blocks and clear it """
+        if not self.table:
+            return
+        entries = sorted(((hash_of(key), key, value) for key, value in self.table.items()), key=_order)
+        fd, path = tempfile.mkstemp(prefix='user-spill-', suffix='.run', dir=self.spill_dir)
+        firsts, offsets = [], [0]
+        with os.fdopen(fd, 'wb') as f:
+            for i in range(0, len(entries), BLOCK_ENTRIES):
+                block = entries[i:i + BLOCK_ENTRIES]
+                firsts.append(block[0][0])
+                offsets.append(offsets[-1] + f.write(pickle.dumps(block, protocol=pickle.HIGHEST_PROTOCOL)))
+        self.runs.append((path, firsts, offsets))
+        self.spilled += len(entries)
+        self.table = defaultdict(float)
+
+    def _read_run(self, run, low, high):
+        """ sorted (hash, username, sum) of one run with low <= hash < high, one block in memory """
+        path, firsts, offsets = run
+        # the block before the first one starting at >= low can still hold hashes >= low
+        i = max(bisect_left(firsts, low) - 1, 0)
+        with open(path, 'rb') as f:
+            f.seek(offsets[i])
+            while i < len(firsts) and firsts[i] < high:
+                for entry in pickle.loads(f.read(offsets[i + 1] - offsets[i])):
+                    if entry[0] >= high:
+                        return
+                    if entry[0] >= low:
+                        yield entry
+                i += 1
+
+    def stream(self, low=0, high=HASH_SPACE):
+        """ sorted (hash, username, sum) with low <= hash < high over every run and the dict, one per user """
+        table = sorted(((h, key, value) for key, value in self.table.items() if low <= (h := hash_of(key)) < high),
+                       key=_order)
+        return combine([self._read_run(run, low, high) for run in self.runs] + [table])
+
+    def merge(self, other):
+        """ add every sum of another aggregator (pool worker), its run files are removed afterwards """
+        for _, key, value in other.stream():
+            self.add(None, key, value)
+        other.close()
+
+    def items(self):
+        """ every (username, sum) in hash order """
+        return ((key, value) for _, key, value in self.stream())
+
+    def close(self):
+        """ remove the run files """
+        for path, _, _ in self.runs:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.runs = []
+
+
+def combine(sources):
+    """ yield (hash, key, sum) of sorted (hash, key, value) iterables, equal keys summed in source order """
+    current = None
+    for entry in heapq.merge(*sources, key=_order):
+        if current is not None and _order(current) == _order(entry):
+            current = (current[0], current[1], current[2] + entry[2])
+            continue
+        if current is not None:
+            yield current
+        current = entry
+    if current is not None:
+        yield current
+
+
+def keep_extremes(pairs, k, happiest=(), saddest=()):
+    """ (k largest, k smallest) (key, value) of pairs and the given lists, one pass over pairs """
+    top = [(value, key) for key, value in happiest]
+    bottom = [(-value, key) for key, value in saddest]
+    heapq.heapify(top)
+    heapq.heapify(bottom)
+    for key, value in pairs:
+        for heap, item in ((top, (value, key)), (bottom, (-value, key))):
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    return ([(key, value) for value, key in sorted(top, reverse=True)[:k]],
+            [(key, -value) for value, key in sorted(bottom, reverse=True)[:k]])
+
+
+def reduce_spilled_users(comm, aggregator, k=5, root=0):
+    """ (happiest, saddest) [(username, score)] on root, None on other ranks (collective), exact """
+    rank, size = comm.Get_rank(), comm.Get_size()
+    # 所有 rank 的条目数 / 预算 = 分区数，每个分区（所有 rank 合起来）大约一个预算
+    entries = comm.allreduce(aggregator.spilled + len(aggregator.table))
+    partitions = max(size, -(-entries // aggregator.max_entries))
+    happiest, saddest = [], []
+    for p in range(partitions):
+        # one partition in flight: rank p % size merges it and keeps only its top / bottom k
+        owner = p % size
+        low, high = p * HASH_SPACE // partitions, (p + 1) * HASH_SPACE // partitions
+        parts = comm.gather(list(aggregator.stream(low, high)), root=owner)
+        if rank == owner:
+            totals = ((key, value) for _, key, value in combine(parts))
+            happiest, saddest = keep_extremes(totals, k, happiest, saddest)
+    aggregator.close()
+
+    candidates = comm.gather((happiest, saddest), root=root)
+    if rank != root:
+        return None
+    return keep_extremes((), k, [c for top, _ in candidates for c in top],
+                         [c for _, bottom in candidates for c in bottom])
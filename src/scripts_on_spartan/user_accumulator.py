@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: user_accumulator.py
+  @Contact: 228077gy@gmail.com
+  @Description: integer-keyed, numpy-backed user sentiment accumulator (--users numpy)
+    1. account.id (decimal string, fits in int64) is interned to a dense int32 index through a sorted
+       int64 lookup array, sentiment sums live in a growable float64 array -> no str / tuple / float
+       object per user, ~40 bytes per user instead of a dict entry with its key and value objects
+    2. records are buffered and folded in batches: searchsorted + np.unique + np.bincount
+    3. usernames sit in a side table (one utf-8 blob + end offsets) and are only decoded for the
+       final top / bottom k users
+    4. users are identified by account.id, two accounts sharing a username are kept apart and a
+       renamed account keeps the first username seen
+  @Date: File created in 11:00-2026/10/19
+  @Modified by:
+  @Version: V1.0
+"""
+import hashlib
+
+import numpy as np
+
+BATCH_SIZE = 64 * 1024  # records buffered before one vectorised fold
+_INITIAL_CAPACITY = 1024
+
+
+def to_int_ids(user_ids):
+    """ int64 array of account ids, a non numeric id gets a stable signed 64 bit hash """
+    try:
+        return np.array(user_ids).astype(np.int64)
+    except (ValueError, OverflowError):
+        return np.array([int(u) if str(u).isdigit() and int(u) < 2 ** 63 else
+                         int.from_bytes(hashlib.blake2b(str(u).encode('utf-8'), digest_size=8).digest(),
+                                        'big', signed=True)
+                         for u in user_ids], dtype=np.int64)
+
+
+class UserAccumulator:
+    """ per-user sentiment sums keyed by int64 account id """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.size = 0  # number of interned users
+        self.lookup_ids = np.empty(0, np.int64)  # sorted account ids
+        self.lookup_index = np.empty(0, np.int32)  # dense index of lookup_ids[i]
+        self.sums = np.zeros(_INITIAL_CAPACITY, np.float64)  # sums[dense index]
+        self.name_ends = np.zeros(_INITIAL_CAPACITY, np.int64)  # username of index i = blob[ends[i-1]:ends[i]]
+        self.name_blob = bytearray()
+        self._ids = []
+        self._sentiments = []
+        self._names = []
+
+    def __len__(self):
+        self.flush()
+        return self.size
+
+    def add(self, user_id, username, sentiment):
+        """ buffer one record, folded with the next flush() """
+        self._ids.append(user_id)
+        self._sentiments.append(sentiment)
+        self._names.append(username)
+        if len(self._ids) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """ fold the buffered records into the arrays """
+        if not self._ids:
+            return
+        names = self._names
+        self.add_batch(to_int_ids(self._ids), np.array(self._sentiments, dtype=np.float64), names.__getitem__)
+        self._ids, self._sentiments, self._names = [], [], []
+
+    def add_batch(self, ids, sentiments, name_of):
+        """ add sentiments[i] to user ids[i], name_of(i) gives the username of a first-seen id """
+        index = self._intern(ids, name_of)
+        unique_index, inverse = np.unique(index, return_inverse=True)
+        self.sums[unique_index] += np.bincount(inverse, weights=sentiments)
+
+    def merge(self, other):
+        """ add every user sum of another accumulator (pool worker / rank) """
+        other.flush()
+        self.add_batch(other.lookup_ids, other.sums[other.lookup_index],
+                       lambda i: other.name(other.lookup_index[i]))
+
+    def name(self, index):
+        """ username of a dense index """
+        start = self.name_ends[index - 1] if index else 0
+        return bytes(self.name_blob[start:self.name_ends[index]]).decode('utf-8')
+
+    def arrays(self):
+        """ (sorted account ids, their sums) """
+        self.flush()
+        return self.lookup_ids, self.sums[self.lookup_index]
+
+    def names_of(self, ids):
+        """ {account id: username} of the given ids known here """
+        self.flush()
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.lookup_ids, ids), max(self.size - 1, 0))
+        return {int(user_id): self.name(self.lookup_index[p])
+                for user_id, p in zip(ids, pos) if self.size and self.lookup_ids[p] == user_id}
+
+    def _grow(self, needed):
+        capacity = len(self.sums)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self.sums = np.concatenate([self.sums, np.zeros(capacity - len(self.sums), np.float64)])
+        self.name_ends = np.concatenate([self.name_ends, np.zeros(capacity - len(self.name_ends), np.int64)])
+
+    def _intern(self, ids, name_of):
+        """ dense index of every id, first-seen ids get the next free indices """
+        pos = np.searchsorted(self.lookup_ids, ids)
+        if self.size:
+            known = self.lookup_ids[np.minimum(pos, self.size - 1)] == ids
+        else:
+            known = np.zeros(len(ids), dtype=bool)
+        if known.all():
+            return self.lookup_index[pos]
+
+        unknown = np.flatnonzero(~known)
+        new_ids, first = np.unique(ids[unknown], return_index=True)
+        new_index = np.arange(self.size, self.size + len(new_ids), dtype=np.int32)
+        self._grow(self.size + len(new_ids))
+
+        names = [name_of(i).encode('utf-8') for i in unknown[first]]
+        base = len(self.name_blob)
+        self.name_blob += b''.join(names)
+        self.name_ends[self.size:self.size + len(names)] = base + np.cumsum([len(n) for n in names])
+        self.size += len(new_ids)
+
+        insert_at = np.searchsorted(self.lookup_ids, new_ids)
+        self.lookup_ids = np.insert(self.lookup_ids, insert_at, new_ids)
+        self.lookup_index = np.insert(self.lookup_index, insert_at, new_index)
+        return self.lookup_index[np.searchsorted(self.lookup_ids, ids)]
+
+
+def top_bottom_arrays(sums, k):
+    """ (top k, bottom k) positions of sums, ties kept in id order """
+    return np.argsort(-sums, kind='stable')[:k], np.argsort(sums, kind='stable')[:k]
+
+
+def reduce_user_arrays(comm, accumulator, k=5, root=0):
+    """ (happiest, saddest) [(username, score)] on root, None on other ranks (collective) """
+    ids, sums = accumulator.arrays()
+    parts = comm.gather((ids, sums), root=root)
+
+    wanted = None
+    if comm.Get_rank() == root:
+        # vectorised merge: one np.unique over every rank's ids, sums folded by bincount
+        all_ids, inverse = np.unique(np.concatenate([p[0] for p in parts]), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate([p[1] for p in parts]), minlength=len(all_ids))
+        top, bottom = top_bottom_arrays(totals, k)
+        wanted = [(int(all_ids[i]), float(totals[i])) for i in top], \
+                 [(int(all_ids[i]), float(totals[i])) for i in bottom]
+
+    # only the 2k winners are resolved to usernames, by the ranks that saw them
+    wanted = comm.bcast(wanted, root=root)
+    names = comm.gather(accumulator.names_of([user_id for part in wanted for user_id, _ in part]), root=root)
+    if comm.Get_rank() != root:
+        return None
+    resolved = {}
+    for part in names:
+        for user_id, name in part.items():
+            resolved.setdefault(user_id, name)
+    return tuple([(resolved[user_id], score) for user_id, score in part] for part in wanted)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: bench_decoders
+  @Contact: 228077gy@gmail.com
+  @Description: microbenchmark of the line parsers / json decoder backends
+    1. per-line cost of every (parser, decoder) pair on the same ndjson file
+    2. hour and user aggregates of every pair are compared with the stdlib json reference,
+       only a pair with bit-identical sums should be used on spartan
+    usage: python src/test_scripts/bench_decoders.py [data/mastodon-106k.ndjson] [repeat]
+  @Date: File created in 17:10-2026/10/17
+  @Modified by:
+  @Version: V1.0
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts_on_spartan"))
+from decoders import DECODERS
+from hour_bucket import epoch_hour
+from record_parser import PARSERS, get_parser
+
+DATA_PATH = sys.argv[1] if len(sys.argv) > 1 else "data/mastodon-106k.ndjson"
+REPEAT = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+
+def aggregate(lines, parse_line):
+    """ same hour / user sums as mastodon_analysis, in file order """
+    hour_sentiment = {}
+    user_sentiment = {}
+    for line in lines:
+        created_at, sentiment, user_id, username = parse_line(line)
+        if created_at and sentiment is not None and user_id and username:
+            hour = epoch_hour(created_at)
+            if hour is None:
+                continue
+            hour_sentiment[hour] = hour_sentiment.get(hour, 0.0) + sentiment
+            user_sentiment[username] = user_sentiment.get(username, 0.0) + sentiment
+    return hour_sentiment, user_sentiment
+
+
+def main():
+    with open(DATA_PATH, "rb") as f:
+        lines = [line for line in f.read().split(b"\n") if line]
+    print(f"{DATA_PATH}: {len(lines)} lines x {REPEAT} repeats")
+
+    reference = aggregate(lines, get_parser("json", "json"))
+    baseline = None
+    print(f"{'parser':<8}{'decoder':<10}{'us/line':>10}{'speedup':>10}  aggregates")
+    for parser in PARSERS:
+        for decoder in DECODERS:
+            parse_line = get_parser(parser, decoder)
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                for line in lines:
+                    parse_line(line)
+            per_line = (time.perf_counter() - start) / (REPEAT * len(lines)) * 1e6
+            baseline = baseline or per_line
+            identical = aggregate(lines, parse_line) == reference
+            print(f"{parser:<8}{decoder:<10}{per_line:>10.2f}{baseline / per_line:>9.2f}x  "
+                  f"{'identical' if identical else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: bench_kernels
+  @Contact: 228077gy@gmail.com
+  @Description: lines/s and MB/s of the single-rank kernels of mastodon_analysis
+    1. read      -- mmap_reader.iter_lines over the whole file
+    2. parse     -- every (parser, decoder) pair on the lines kept in memory
+    3. bucket    -- hour_bucket.epoch_hour on the parsed createdAt strings
+    4. aggregate -- hour + user sums from the parsed tuples, username dict and UserAccumulator
+    5. scan      -- local_scan.scan_range end to end (read + parse + bucket + aggregate)
+    before timing, HourHistogram is checked against a plain dict on hours far apart (regression: an
+    anchor no hour was close to left the dense range empty and add_batch failed), and the fast parser
+    against json.loads on lines with braces inside string values (regression: a "}" in account.note made
+    a nested "id" / "username" look top-level), and epoch_hour against fromisoformat on broken minutes,
+    seconds and zones (regression: only the "YYYY-MM-DDTHH" prefix was validated)
+    each kernel is timed on its own input, so a change in one stage shows up in one row;
+    MB/s always refers to the ndjson bytes the lines came from
+    usage: python src/test_scripts/gen_mastodon.py data/synthetic-256m.ndjson --size 256M --seed 1
+           python src/test_scripts/bench_kernels.py data/synthetic-256m.ndjson [--repeat 3]
+  @Date: File created in 11:20-2026/10/21
+  @Modified by:
+  @Version: V1.0
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts_on_spartan"))
+from decoders import DECODERS
+from hour_bucket import _hour_cache, epoch_hour, format_hour
+from hour_histogram import MAX_DENSE_HOURS, HourHistogram
+from local_scan import ScanOptions, scan_range
+from mmap_reader import iter_lines, open_mmap
+from record_parser import PARSERS, get_parser, parse_line_fast
+from user_accumulator import UserAccumulator
+
+
+def check_histogram():
+    """ HourHistogram equals a {hour: sum} dict, batch by batch and record by record, with sparse hours """
+    far = MAX_DENSE_HOURS * 3
+    cases = [[480000, 480000 + far], [480000, 480000 + far, 480001, 480000 - far, 480000], [480000] * 3]
+    for hours in cases:
+        sentiments = [float(i + 1) for i in range(len(hours))]
+        expected = defaultdict(float)
+        for hour, sentiment in zip(hours, sentiments):
+            expected[hour] += sentiment
+        batched = HourHistogram()
+        batched.add_batch(np.array(hours, np.int64), np.array(sentiments))
+        for batch_size in (1, 2, 64):
+            single = HourHistogram(batch_size=batch_size)
+            for hour, sentiment in zip(hours, sentiments):
+                single.add(hour, sentiment)
+            for histogram in (batched, single):
+                if histogram.to_dict() != dict(expected):
+                    raise AssertionError(f"HourHistogram {histogram.to_dict()} != {dict(expected)} for hours {hours}")
+
+
+def check_fast_parser():
+    """ parse_line_fast equals the json parser on records with braces and escapes inside string values """
+    notes = ['}', '{', '}}{', 'a\\"}', '\\', '\\"{', '{"id":"3"}']
+    for note in notes:
+        # createdAt / sentiment first like the real records, so only the account lookups meet the note
+        record = {'doc': {'createdAt': '2025-01-01T10:00:00.000Z', 'sentiment': 0.5, 'content': 'hi',
+                          'account': {'note': note, 'moved': {'id': '2', 'username': 'evil'}, 'id': '1',
+                                      'username': 'u'}}}
+        line = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        expected = get_parser('json', 'json')(line)
+        if parse_line_fast(line) != expected:
+            raise AssertionError(f"fast parser {parse_line_fast(line)} != json {expected} for {line!r}")
+
+
+def check_epoch_hour():
+    """ epoch_hour keeps exactly the timestamps fromisoformat (with "Z" as +00:00) accepts, on common forms """
+    tails = ['', ':30', ':30:00', ':30:00.000Z', ':30:00,5+05:30', ':30:00-0230', ':99:00Z', ':30:60Z', ':30:00+24:00',
+             ':30:00 ', ':30:00.000Zjunk', ':3:00Z', ':30:00+05:3']
+    for created_at in (hour + tail for hour in ('2025-01-01T10', '2024-02-29 23', '2025-02-29T10') for tail in tails):
+        try:
+            expected = datetime.fromisoformat(created_at.replace('Z', '+00:00')).strftime('%Y-%m-%d %H:00')
+        except ValueError:
+            expected = None
+        hour = epoch_hour(created_at)
+        if (format_hour(hour) if hour is not None else None) != expected:
+            raise AssertionError(f"epoch_hour({created_at!r}) = {hour}, fromisoformat gives {expected}")
+
+
+def best_of(repeat, kernel):
+    """ fastest of repeat runs in seconds (less noise from other processes) """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        kernel()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def read_kernel(path):
+    with open_mmap(path) as mm:
+        for _ in iter_lines(mm, 0, len(mm)):
+            pass
+
+
+def parse_kernel(lines, parse_line):
+    for line in lines:
+        parse_line(line)
+
+
+def bucket_kernel(created):
+    # a cold cache per run, the real scan starts cold too
+    _hour_cache.clear()
+    for created_at in created:
+        epoch_hour(created_at)
+
+
+def dict_aggregate_kernel(records):
+    hour_sentiment = defaultdict(float)
+    user_sentiment = defaultdict(float)
+    for hour, sentiment, user_id, username in records:
+        hour_sentiment[hour] += sentiment
+        user_sentiment[username] += sentiment
+
+
+def numpy_aggregate_kernel(records):
+    hour_sentiment = defaultdict(float)
+    users = UserAccumulator()
+    for hour, sentiment, user_id, username in records:
+        hour_sentiment[hour] += sentiment
+        users.add(user_id, username, sentiment)
+    users.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='microbenchmark of the read / parse / bucket / aggregate kernels')
+    parser.add_argument('path', nargs='?', default='data/mastodon-106k.ndjson')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per kernel, the fastest one is reported')
+    args = parser.parse_args()
+
+    check_histogram()
+    check_fast_parser()
+    check_epoch_hour()
+    size_mb = os.path.getsize(args.path) / (1024 * 1024)
+    with open_mmap(args.path) as mm:
+        lines = list(iter_lines(mm, 0, len(mm)))
+    parse_line = get_parser("json", "json")
+    parsed = [parse_line(line) for line in lines]
+    failures = sum(1 for created_at, sentiment, user_id, username in parsed if created_at is None)
+    created = [p[0] for p in parsed if p[0]]
+    records = [(epoch_hour(created_at), sentiment, user_id, username)
+               for created_at, sentiment, user_id, username in parsed
+               if created_at and sentiment is not None and user_id and username and epoch_hour(created_at) is not None]
+    print(f"{args.path}: {size_mb:.1f} MB, {len(lines)} lines, {failures} without createdAt / unparsable, "
+          f"{len(records)} aggregated, best of {args.repeat}")
+
+    kernels = [("read", "mmap lines", len(lines), lambda: read_kernel(args.path))]
+    for parser_name in PARSERS:
+        for decoder in DECODERS:
+            parse = get_parser(parser_name, decoder)
+            kernels.append(("parse", f"{parser_name}/{decoder}", len(lines), lambda parse=parse: parse_kernel(lines, parse)))
+    kernels += [
+        ("bucket", "epoch_hour", len(created), lambda: bucket_kernel(created)),
+        ("aggregate", "dict", len(records), lambda: dict_aggregate_kernel(records)),
+        ("aggregate", "numpy", len(records), lambda: numpy_aggregate_kernel(records)),
+        ("scan", "json/json", len(lines), lambda: scan_range(args.path, 0, os.path.getsize(args.path), ScanOptions())),
+        ("scan", "fast/json", len(lines),
+         lambda: scan_range(args.path, 0, os.path.getsize(args.path), ScanOptions(parser="fast"))),
+    ]
+
+    print(f"{'kernel':<11}{'variant':<16}{'seconds':>9}{'lines/s':>13}{'MB/s':>9}")
+    for kernel, variant, count, run in kernels:
+        seconds = best_of(args.repeat, run)
+        print(f"{kernel:<11}{variant:<16}{seconds:>9.3f}{count / seconds:>13,.0f}{size_mb / seconds:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
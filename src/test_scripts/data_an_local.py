@@ -12,15 +12,21 @@
   @Version: V1.0
 """
 import io
-import json
+import os
 import sys
 from mpi4py import MPI
 
+# shared decoders live in scripts_on_spartan
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts_on_spartan"))
+from decoders import DECODE_ERRORS, get_decoder
+
 comm = MPI.COMM_WORLD
 rank = comm.Get_rank()
 size = comm.Get_size()
 
 CHUNK_SIZE = 10  # chunk size for each process
+DECODER = "json"  # "json", "orjson", "msgspec" or "auto"
+decode = get_decoder(DECODER)
 
 # GBK -> utf-8 forced
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -55,14 +61,13 @@ def process_data(data_chunk):
     results = []
     for line in data_chunk:
         try:
-            data = json.loads(line).get("doc", {})
-            value = data.get("sentiment", 0.00)
-            user_id = data.get("account", {}).get("id", "")
-            user_name = data.get("account", {}).get("username", "")
-            create_time = data.get("createdAt", None)
+            create_time, value, user_id, user_name = decode(line)
+            value = 0.00 if value is None else value
+            user_id = user_id or ""
+            user_name = user_name or ""
             hour = create_time.split("T")[1][:2] if create_time else None
             results.append([user_id, user_name, hour, value])
-        except json.JSONDecodeError:
+        except DECODE_ERRORS:
             print(f"Skipping invalid JSON: {line}")
         except Exception as e:
             print(f"Error processing line: {line}, Error: {e}")
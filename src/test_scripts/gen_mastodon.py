@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+  @Author: Garvyn-Yuan
+  @FIle Name: gen_mastodon
+  @Contact: 228077gy@gmail.com
+  @Description: synthetic mastodon ndjson generator (same doc / account schema as the harvest)
+    1. writes records until the target size is reached, e.g. 16M, 2G
+    2. users are drawn from a zipf-like distribution (--skew), a few bot accounts (gameoflife style)
+       post a fixed share of all records (--bot-share)
+    3. createdAt is uniform over --days days from --start, a share of posts has sentiment null
+    4. --malformed sets the rate of broken lines: truncated json, garbage, missing account,
+       bad createdAt, blank lines -> the parsers' error paths get exercised too
+    usage: python src/test_scripts/gen_mastodon.py data/synthetic-1g.ndjson --size 1G --seed 1
+  @Date: File created in 10:30-2026/10/21
+  @Modified by:
+  @Version: V1.0
+"""
+import argparse
+import json
+import random
+import string
+from datetime import datetime, timedelta, timezone
+
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+INSTANCES = ['mastodon.social', 'mastodon.au', 'aus.social', 'mastodon.online', 'fosstodon.org', 'hachyderm.io']
+WORDS = ['the', 'news', 'today', 'melbourne', 'great', 'sad', 'happy', 'trump', 'climate', 'coffee', 'python',
+         'mpi', 'spartan', 'weather', 'love', 'hate', 'music', 'game', 'life', 'cell', 'generation', 'storm']
+MALFORMED_KINDS = ('truncated', 'garbage', 'no_account', 'bad_date', 'blank')
+
+
+def parse_size(text):
+    """ '16M' -> bytes """
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def make_users(rng, num_users, num_bots):
+    """ (id, username) of the regular users followed by the bots """
+    users = [(str(109000000000000000 + rng.randrange(10 ** 15)),
+              ''.join(rng.choices(string.ascii_lowercase + string.digits + '_', k=rng.randint(4, 15))))
+             for _ in range(num_users)]
+    bots = [(str(110000000000000000 + i), f'gameoflife{i}' if i else 'gameoflife') for i in range(num_bots)]
+    return users, bots
+
+
+def make_record(rng, user, created_at, sentiment, is_bot):
+    user_id, username = user
+    instance = INSTANCES[int(user_id) % len(INSTANCES)]
+    words = rng.choices(WORDS, k=int(rng.lognormvariate(3.5, 0.8)) + 1)
+    return {"doc": {
+        "sensitive": False,
+        "createdAt": created_at,
+        "content": "<p>" + " ".join(words) + "</p>",
+        "sentiment": sentiment,
+        "filtered": [],
+        "favouritesCount": rng.randrange(20),
+        "url": f"https://{instance}/@{username}/{rng.randrange(10 ** 17)}",
+        "mentions": [],
+        "inReplyToId": None,
+        "tags": [{"name": w} for w in words[:rng.randrange(3)]],
+        "visibility": "public",
+        "repliesCount": 0,
+        "editedAt": None,
+        "reblog": None,
+        "account": {
+            "fields": [],
+            "avatar": f"https://{instance}/avatars/original/missing.png",
+            "createdAt": "2022-11-01T00:00:00.000Z",
+            "statusesCount": rng.randrange(10000),
+            "bot": is_bot,
+            "id": user_id,
+            "url": f"https://{instance}/@{username}",
+            "locked": False,
+            "followersCount": rng.randrange(5000),
+            "username": username,
+            "group": False,
+            "acct": f"{username}@{instance}",
+            "followingCount": rng.randrange(1000),
+            "displayName": username.title(),
+            "emojis": [],
+            "note": "",
+            "discoverable": True,
+        },
+        "mediaAttachments": [],
+        "language": "en",
+        "reblogsCount": 0,
+        "emojis": [],
+        "card": None,
+        "poll": None,
+    }, "@version": "1", "@timestamp": "2025-02-07T09:30:15.916537285Z", "doc_as_upsert": True}
+
+
+def malformed_line(rng, line):
+    kind = rng.choice(MALFORMED_KINDS)
+    if kind == 'truncated':
+        return line[:rng.randrange(1, len(line))]
+    if kind == 'garbage':
+        return ''.join(rng.choices(string.printable[:94], k=rng.randint(1, 200)))
+    if kind == 'no_account':
+        record = json.loads(line)
+        del record["doc"]["account"]
+        return json.dumps(record, ensure_ascii=False)
+    if kind == 'bad_date':
+        return line.replace('"createdAt":"2', '"createdAt":"x2', 1)
+    return ''
+
+
+def generate(path, size, num_users=100000, skew=1.1, num_bots=3, bot_share=0.05, start='2025-01-01',
+             days=60, malformed=0.001, null_sentiment=0.05, seed=None):
+    """ write about size bytes of records to path, returns the number of lines """
+    rng = random.Random(seed)
+    users, bots = make_users(rng, num_users, num_bots)
+    # zipf-like: weight of the i-th most active user ~ 1 / i^skew
+    cum_weights, total = [], 0.0
+    for i in range(num_users):
+        total += 1.0 / (i + 1) ** skew
+        cum_weights.append(total)
+    first = datetime.fromisoformat(start).replace(tzinfo=timezone.utc)
+    span = days * 86400
+
+    written = lines = 0
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        while written < size:
+            batch = []
+            for user in rng.choices(users, cum_weights=cum_weights, k=1000):
+                is_bot = rng.random() < bot_share
+                if is_bot:
+                    user = rng.choice(bots)
+                created_at = (first + timedelta(seconds=rng.random() * span)).isoformat(timespec='milliseconds')
+                sentiment = None if rng.random() < null_sentiment else round(rng.uniform(-1.0, 1.0), 6)
+                line = json.dumps(make_record(rng, user, created_at.replace('+00:00', 'Z'), sentiment, is_bot),
+                                  ensure_ascii=False, separators=(',', ':'))
+                if rng.random() < malformed:
+                    line = malformed_line(rng, line)
+                batch.append(line + '\n')
+            chunk = ''.join(batch)
+            f.write(chunk)
+            written += len(chunk.encode('utf-8'))
+            lines += len(batch)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='synthetic mastodon ndjson generator')
+    parser.add_argument('path', help='output ndjson file')
+    parser.add_argument('--size', default='16M', help='target size, e.g. 500K, 16M, 2G')
+    parser.add_argument('--users', type=int, default=100000, help='number of regular accounts')
+    parser.add_argument('--skew', type=float, default=1.1, help='zipf exponent of the posts per account')
+    parser.add_argument('--bots', type=int, default=3, help='number of bot accounts')
+    parser.add_argument('--bot-share', type=float, default=0.05, help='share of all posts written by bots')
+    parser.add_argument('--start', default='2025-01-01', help='first day of the time span')
+    parser.add_argument('--days', type=float, default=60, help='length of the time span in days')
+    parser.add_argument('--malformed', type=float, default=0.001, help='rate of malformed lines')
+    parser.add_argument('--null-sentiment', type=float, default=0.05, help='rate of posts without sentiment')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    lines = generate(args.path, parse_size(args.size), args.users, args.skew, args.bots, args.bot_share,
+                     args.start, args.days, args.malformed, args.null_sentiment, args.seed)
+    print(f"Wrote {lines} lines to {args.path}")
+
+
+if __name__ == "__main__":
+    main()